@@ -1,13 +1,30 @@
 # —— Modules
 from flask import Flask, request, render_template  #pylint: disable=import-error
-from module.create_connection import create_connection
-from module.shared import DB_PATH, DB_ERROR
-from module.find import app_find
+from telegram import Update
+from module.create_connection import get_connection, data_version
+from module.shared import DB_ERROR, CURSOR_ERROR, API_PAGE_SIZE, API_MAX_PAGE_SIZE, MIN_QUERY_LENGTH, SEARCH_CACHE_SIZE, WEBHOOK_PATH, SUGGEST_LIMIT, SUGGEST_MAX_LIMIT, SUGGEST_MIN_LENGTH
+from module.find import app_find, fts_query, SearchOptions
+from module.price import price_cents
+from module.metrics import render as render_metrics
+from module.prefix_index import market_index
+from module.result_cache import ResultCache
+from module.send_results import split_page, is_valid_cursor
+import hmac
 import json
+import time
+import zlib
 
 # creating the flask app
 app = Flask(__name__)
 
+# serialized /search responses, valid as long as
+# the database doesn't change
+search_cache = ResultCache(SEARCH_CACHE_SIZE)
+
+# data_version restarts with the process,
+# so it can't be the only part of an ETag
+START_TOKEN = format(int(time.time()), 'x')
+
 
 # —— API Routes
 # • /
@@ -23,38 +40,135 @@ def home():
 def ping():
     return respond({'message': 'pong'})
 
-# • /search?q={}
+# • /search?q={}&limit={}&cursor={}&max_price={}&sort={}
 # search books in the
-# bot's local database
+# bot's local database: sort=price
+# lists the cheapest ones first
 @app.route('/search')
 def search():
     # getting user input
-    query = request.args.get('q')
+    query = request.args.get('q', '').strip()
+    cursor = request.args.get('cursor') or None
+    limit = max(1, min(request.args.get('limit', API_PAGE_SIZE, type = int), API_MAX_PAGE_SIZE))
+    options = SearchOptions(price_cents(request.args.get('max_price', '')), request.args.get('sort') == 'price')
+
+    # too short queries would match
+    # most of the market
+    if len(query) < MIN_QUERY_LENGTH:
+        return respond({'results': [], 'next_cursor': None})
 
-    # creating connection
-    conn = create_connection(DB_PATH)
-    if not conn:
-        # returning error message
+    # the cursor must be a next_cursor
+    # of a previous response
+    if not is_valid_cursor(cursor):
+        return respond({'message': CURSOR_ERROR}, success = False, status = 400)
+
+    # the same words, whatever their case or
+    # punctuation, give the same results
+    key = (fts_query(query).lower(), limit, cursor, options)
+    version = data_version()
+    if version is None:
         return respond({'message': DB_ERROR}, success = False)
 
-    # querying the database
-    rows = app_find(query, conn, "Market")
-    # closing connection
-    conn.close()
+    # the client already has these results
+    etag = f'{START_TOKEN}-{version}-{zlib.crc32(repr(key).encode()):x}'
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status = 304)
+        response.set_etag(etag)
+        return response
+
+    body = search_cache.get(key, version)
+    if body is None:
+        # borrowing a pooled connection
+        with get_connection() as conn:
+            if not conn:
+                # returning error message
+                return respond({'message': DB_ERROR}, success = False)
+
+            # querying the database
+            rows = app_find(query, conn, "Market", cursor, limit, options)
+        rows, next_cursor = split_page(rows, limit)
+        # the sort key is only needed for the cursor
+        body = to_json({'results': [row[:6] for row in rows], 'next_cursor': next_cursor})
+        search_cache.put(key, body, version)
+
     # returning results
-    return respond({'results': rows})
+    response = json_response(body)
+    response.set_etag(etag)
+    # the browser must ask again every time,
+    # but it will get a 304 if nothing changed
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# • /suggest?q={}&limit={}
+# completions of the titles, authors and
+# ISBNs on sale, while the user is typing
+@app.route('/suggest')
+def suggest():
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', SUGGEST_LIMIT, type = int), SUGGEST_MAX_LIMIT))
+    if len(query) < SUGGEST_MIN_LENGTH:
+        return respond({'suggestions': []})
+
+    version = data_version()
+    if version is None:
+        return respond({'message': DB_ERROR}, success = False)
+
+    # the index catches up with the
+    # books added or removed since the last call
+    with get_connection() as conn:
+        if not conn:
+            return respond({'message': DB_ERROR}, success = False)
+        market_index.refresh(conn, version)
+
+    return respond({'suggestions': market_index.suggest(query, limit)})
+
+
+# • /metrics
+# the bot's counters and latencies,
+# in the Prometheus text format
+@app.route('/metrics')
+def metrics():
+    response = app.response_class(render_metrics())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+# • /telegram/{secret}
+# receives the bot's updates in webhook mode.
+# main.py sets BOT, UPDATE_QUEUE and WEBHOOK_SECRET
+@app.route(WEBHOOK_PATH + '<secret>', methods = ['POST'])
+def telegram_update(secret):
+    # only Telegram knows the secret, that
+    # is sent to it along with the url
+    expected = app.config.get('WEBHOOK_SECRET')
+    if not expected or not hmac.compare_digest(secret, expected):
+        return app.response_class(status = 404)
+
+    update = Update.de_json(request.get_json(force = True, silent = True), app.config['BOT'])
+    if update is not None:
+        # the dispatcher handles it in its own threads,
+        # so Telegram gets its answer right away
+        app.config['UPDATE_QUEUE'].put(update)
+    return app.response_class(status = 200)
 
 
 # —— Utils
-def respond(data, success = True):
+def respond(data, success = True, status = 200):
+    return json_response(to_json(data, success), status)
+
+
+def to_json(data, success = True):
     data['success'] = success
-    # 1. python dict to json string
-    data = json.dumps(data)
-    # 2. creating the response object
-    response = app.response_class(data)
-    # 3. adding some headers
-    response.headers.add('Content-Type', 'application/json')
-    # 4. CORS support
+    # python dict to json string
+    return json.dumps(data)
+
+
+def json_response(data, status = 200):
+    # 1. creating the response object
+    response = app.response_class(data, status = status)
+    # 2. adding some headers
+    response.headers['Content-Type'] = 'application/json'
+    # 3. CORS support
     # in order to access data from a browser,
     # the server must include this header
     response.headers.add('Access-Control-Allow-Origin', '*')
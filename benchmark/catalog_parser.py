@@ -0,0 +1,68 @@
+# Compares parse time and peak memory of module.catalog_parser with the code it replaced,
+# on the sample catalog pages in benchmark/pages.
+# Usage: python -m benchmark.catalog_parser [--repeat N]
+import argparse
+import os
+import re
+import time
+import tracemalloc
+from bs4 import BeautifulSoup
+from module.catalog_parser import parse_catalog_page
+from module.shared import NO_MATCHES, ISBN_PREFIX_1, ISBN_PREFIX_2
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "pages")
+
+
+# the parsing done by book_in_unict and sell._get_isbn_from_website before catalog_parser
+def legacy_parse(content: bytes):
+    soup = BeautifulSoup(content, "html.parser")
+    check = str(soup.findAll("td"))
+    if NO_MATCHES in check:
+        return None
+
+    idx = len(str(soup.findAll("td")).split("bibInfoData")) - 1
+    isbn = str(soup.findAll("td")) \
+        .split("bibInfoData")[idx] \
+        .split("\n")[1] \
+        .split("<")[0]
+    isbn = isbn.replace('-','')
+    if len(isbn) > 13:
+        for prefix in (ISBN_PREFIX_1, ISBN_PREFIX_2):
+            p = re.search(prefix, isbn)
+            if p is not None:
+                s = p.span()[0]
+                isbn = isbn[s:s+13]
+                break
+    title, authors = soup.find("strong").text.split("/")
+    return (isbn, title.strip(), authors.strip())
+
+
+def _measure(parse, content: bytes, repeat: int) -> tuple:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(content)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    parse(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def run(repeat: int) -> None:
+    print(f"{'page':<28} {'parser':<8} {'time':>10} {'peak memory':>12}")
+    for name in sorted(os.listdir(PAGES_DIR)):
+        with open(os.path.join(PAGES_DIR, name), "rb") as page:
+            content = page.read()
+        assert legacy_parse(content) == parse_catalog_page(content), name
+        for label, parse in (("legacy", legacy_parse), ("new", parse_catalog_page)):
+            elapsed, peak = _measure(parse, content, repeat)
+            print(f"{name:<28} {label:<8} {elapsed * 1000:8.3f}ms {peak / 1024:10.1f}KB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Benchmark the catalog page parser")
+    parser.add_argument("--repeat", type = int, default = 200)
+    args = parser.parse_args()
+    run(args.repeat)
@@ -0,0 +1,96 @@
+# Compares the old open-per-query access path with the pooled connections
+# of module.create_connection.
+# Usage: python -m benchmark.connection [--queries N] [--rows N]
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from module.config import Config, set_config
+from module.create_connection import connect_and_execute, close_connections, transaction
+from module.shared import INSERT, SELECT
+
+DIST_DB = "data/bookmarket.db.dist"
+
+SELECT_QUERY = "SELECT * FROM Books WHERE ISBN=?"
+
+INSERT_QUERY = "INSERT INTO Market(ISBN, Title, Authors, Seller, Price) VALUES(?,?,?,?,?)"
+
+
+# the access path used before the connection pool: connect, execute, commit and close every time
+def legacy_execute(db_file: str, query: str, params: tuple, operation: str):
+    conn = sqlite3.connect(db_file)
+    cur = conn.cursor()
+    cur.execute(query, params)
+    if operation == INSERT:
+        conn.commit()
+        last_row_id = cur.lastrowid
+        conn.close()
+        return last_row_id
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+
+def _fill_books(db_file: str, rows: int) -> None:
+    conn = sqlite3.connect(db_file)
+    conn.executemany("INSERT INTO Books(ISBN, Title, Authors) VALUES(?,?,?)",
+                     ((str(9788800000000 + i), f"Titolo {i}", f"Autore {i}") for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def _timed(label: str, n: int, fn) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:10.1f} ms  {elapsed / n * 1e6:8.1f} us/op")
+    return elapsed
+
+
+def run(queries: int, rows: int) -> None:
+    tmp_dir = tempfile.mkdtemp()
+    db_file = os.path.join(tmp_dir, "bookmarket.db")
+    shutil.copyfile(DIST_DB, db_file)
+    _fill_books(db_file, rows)
+    set_config(Config(db_path = db_file))
+
+    def isbn(i):
+        return (str(9788800000000 + i % rows),)
+
+    def item(i):
+        return (str(9788800000000 + i % rows), "Titolo", "Autore", "@seller", "5.00")
+
+    try:
+        _timed("select, open-per-query", queries, lambda i: legacy_execute(db_file, SELECT_QUERY, isbn(i), SELECT))
+        _timed("select, pooled", queries, lambda i: connect_and_execute(None, 0, SELECT_QUERY, isbn(i), SELECT))
+        _timed("insert, open-per-query", queries, lambda i: legacy_execute(db_file, INSERT_QUERY, item(i), INSERT))
+        _timed("insert, pooled", queries, lambda i: connect_and_execute(None, 0, INSERT_QUERY, item(i), INSERT))
+
+        # a /vendi-like flow: lookup + two inserts, committed once
+        def flow(i):
+            connect_and_execute(None, 0, SELECT_QUERY, isbn(i), SELECT)
+            with transaction():
+                connect_and_execute(None, 0, INSERT_QUERY, item(i), INSERT)
+                connect_and_execute(None, 0, INSERT_QUERY, item(i), INSERT)
+
+        def legacy_flow(i):
+            legacy_execute(db_file, SELECT_QUERY, isbn(i), SELECT)
+            legacy_execute(db_file, INSERT_QUERY, item(i), INSERT)
+            legacy_execute(db_file, INSERT_QUERY, item(i), INSERT)
+
+        _timed("sell flow, open-per-query", queries // 4, legacy_flow)
+        _timed("sell flow, pooled + transaction", queries // 4, flow)
+    finally:
+        close_connections()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Benchmark the database access layer")
+    parser.add_argument("--queries", type = int, default = 2000)
+    parser.add_argument("--rows", type = int, default = 10000)
+    args = parser.parse_args()
+    run(args.queries, args.rows)
@@ -0,0 +1,91 @@
+# Fills a copy of data/bookmarket.db.dist with synthetic, but realistic, books, sales and requests.
+# Usage: python -m benchmark.generate OUTPUT [--books N] [--market N] [--requests N] [--seed N]
+import argparse
+import random
+import shutil
+import sqlite3
+from module.migrations import migrate
+
+DIST_DB = "data/bookmarket.db.dist"
+
+SUBJECTS = (
+    "Analisi matematica", "Geometria e algebra lineare", "Fisica generale", "Chimica generale e inorganica",
+    "Chimica organica", "Biochimica", "Biologia cellulare", "Genetica", "Anatomia umana", "Fisiologia",
+    "Microbiologia", "Farmacologia", "Economia politica", "Economia aziendale", "Diritto privato",
+    "Diritto costituzionale", "Diritto penale", "Diritto commerciale", "Storia contemporanea",
+    "Storia medievale", "Letteratura italiana", "Linguistica generale", "Filosofia teoretica",
+    "Psicologia generale", "Sociologia", "Statistica", "Calcolo delle probabilità", "Fondamenti di informatica",
+    "Basi di dati", "Sistemi operativi", "Reti di calcolatori", "Algoritmi e strutture dati", "Elettrotecnica",
+    "Scienza delle costruzioni", "Meccanica razionale", "Termodinamica", "Architettura dei calcolatori",
+    "Ingegneria del software", "Ricerca operativa", "Marketing", "Glottologia", "Archeologia classica",
+)
+
+KINDS = ("", "", "Manuale di ", "Elementi di ", "Fondamenti di ", "Lezioni di ", "Esercizi di ", "Appunti di ")
+
+EDITIONS = ("", "", " I", " II", " Vol. 1", " Vol. 2", ". Teoria ed esercizi", ". Nuova edizione", " (3ª ed.)")
+
+FIRST_NAMES = (
+    "Giuseppe", "Salvatore", "Giovanni", "Maria", "Francesca", "Antonio", "Rosaria", "Carmela", "Marco",
+    "Luca", "Giulia", "Chiara", "Alessandro", "Davide", "Sofia", "Angela", "Nicolò", "Agata", "Sebastiano",
+    "Concetta", "Paolo", "Elena", "Andrea", "Federica", "Lorenzo", "Gaetano", "Vincenzo", "Martina",
+)
+
+LAST_NAMES = (
+    "Rossi", "Russo", "Ferrari", "Esposito", "Bianchi", "Romano", "Colombo", "Ricci", "Marino", "Greco",
+    "Bruno", "Gallo", "Conti", "De Luca", "Costa", "Giordano", "Mancini", "Rizzo", "Lombardo", "Moretti",
+    "Barbieri", "Fontana", "Santoro", "Mariani", "Rinaldi", "Caruso", "Ferrara", "Sciacca", "Privitera",
+    "Amato", "Musumeci", "Scuderi", "Pappalardo", "La Rosa", "D'Agata", "Nicolosi", "Grasso", "Leonardi",
+)
+
+
+def isbn13(n: int) -> str:
+    digits = f"97888{n % 10 ** 7:07d}"
+    check = (10 - sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digits)) % 10) % 10
+    return digits + str(check)
+
+
+def _book(rnd: random.Random, n: int) -> tuple:
+    title = rnd.choice(KINDS) + rnd.choice(SUBJECTS) + rnd.choice(EDITIONS)
+    title = title[0].upper() + title[1:]
+    authors = ", ".join(f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}" for _ in range(rnd.choice((1, 1, 1, 2, 3))))
+    return (isbn13(n), title, authors)
+
+
+def _price(rnd: random.Random) -> str:
+    return format(rnd.choice((5, 8, 10, 12, 15, 18, 20, 25, 30, 35, 40)) + rnd.choice((0, 0, 0.5, 0.99)), ".2f")
+
+
+def _seller(n: int) -> str:
+    return f"@studente{n}"
+
+
+# sellers are few compared to the sales, as most users sell more than one book
+def generate(db_file: str, books: int, market: int, requests: int, seed: int = 0) -> None:
+    rnd = random.Random(seed)
+    shutil.copyfile(DIST_DB, db_file)
+    conn = sqlite3.connect(db_file, isolation_level = None)
+    migrate(conn)
+    catalog = [_book(rnd, n) for n in range(max(books, 1))]
+    sellers = max(1, market // 4)
+
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO Books(ISBN, Title, Authors) VALUES(?,?,?)", catalog[:books])
+    conn.executemany("INSERT INTO Market(ISBN, Title, Authors, Seller, Price) VALUES(?,?,?,?,?)",
+                     (rnd.choice(catalog) + (_seller(rnd.randrange(sellers)), _price(rnd)) for _ in range(market)))
+    # requests are for books that are not in Books yet
+    conn.executemany("INSERT OR IGNORE INTO Requests(ChatID, ISBN, Title, Authors, Seller, Price) VALUES(?,?,?,?,?,?)",
+                     ((str(100000 + n % sellers), *_book(rnd, books + n), _seller(n % sellers), _price(rnd)) for n in range(requests)))
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Generate a synthetic bookmarket database")
+    parser.add_argument("output")
+    parser.add_argument("--books", type = int, default = 20000)
+    parser.add_argument("--market", type = int, default = 100000)
+    parser.add_argument("--requests", type = int, default = 1000)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+    generate(args.output, args.books, args.market, args.requests, args.seed)
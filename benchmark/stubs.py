@@ -0,0 +1,96 @@
+# Stand-ins for Telegram and for the university catalog, so that the handlers can be timed offline
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import urlparse, parse_qs
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "pages")
+
+# the ISBN in record_found.html, replaced with the one searched
+PAGE_ISBN = b"9788808184115"
+
+
+# records what the handlers send instead of calling Telegram
+class StubBot:
+    def __init__(self, username: str = "studente0") -> None:
+        self.username = username
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def send_message(self, chat_id: int, text: str, **_) -> SimpleNamespace:
+        with self._lock:
+            self.sent += 1
+        return SimpleNamespace(chat_id = chat_id, text = text)
+
+    def get_chat(self, chat_id: int) -> SimpleNamespace:
+        return SimpleNamespace(id = chat_id, username = self.username)
+
+
+class StubCallbackQuery:
+    def __init__(self, data: str) -> None:
+        self.data = data
+
+    def answer(self, *_, **__) -> None:
+        pass
+
+    def edit_message_text(self, *_, **__) -> None:
+        pass
+
+
+def stub_context(bot: StubBot) -> SimpleNamespace:
+    return SimpleNamespace(bot = bot, chat_data = {}, user_data = {})
+
+
+def stub_update(chat_id: int, text: str = None, data: str = None) -> SimpleNamespace:
+    return SimpleNamespace(effective_chat = SimpleNamespace(id = chat_id),
+                           effective_user = SimpleNamespace(id = chat_id, username = None),
+                           message = SimpleNamespace(text = text),
+                           callback_query = StubCallbackQuery(data) if data is not None else None)
+
+
+# serves record_found.html for the ISBN searched, or no_matches.html for the ones starting with 979,
+# after waiting latency seconds. Setting status (e.g. to 503) makes it fail instead, to try the
+# retries and the circuit breaker of module.catalog_client
+# pylint: disable=too-few-public-methods
+class StubCatalog:
+    def __init__(self, latency: float = 0.0) -> None:
+        with open(os.path.join(PAGES_DIR, "record_found.html"), "rb") as page:
+            found = page.read()
+        with open(os.path.join(PAGES_DIR, "no_matches.html"), "rb") as page:
+            no_matches = page.read()
+        self.requests = 0
+        self.latency = latency
+        self.status = 200
+        catalog = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, like the real catalog. Without Nagle's algorithm the body isn't held
+            # back until the client acknowledges the headers
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self): # pylint: disable=invalid-name
+                catalog.requests += 1
+                isbn = parse_qs(urlparse(self.path).query).get("SEARCH", [""])[0]
+                body = no_matches if isbn.startswith("979") else found.replace(PAGE_ISBN, isbn.encode())
+                time.sleep(catalog.latency)
+                if catalog.status != 200:
+                    body = b""
+                self.send_response(catalog.status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args): # pylint: disable=arguments-differ
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}/search/i?SEARCH="
+        threading.Thread(target = self._server.serve_forever, daemon = True).start()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
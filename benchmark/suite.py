@@ -0,0 +1,189 @@
+# Times the bot's handlers and the /search API on synthetic databases of growing size
+# (see benchmark.generate), with a stub Bot and a stub catalog server (see benchmark.stubs).
+# The results can be written as JSON and compared with the ones of another version.
+# Usage: python -m benchmark.suite [--sizes 1000,10000,100000] [--repeat N] [--output FILE] [--compare FILE]
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from benchmark.generate import generate, isbn13
+from benchmark.stubs import StubBot, StubCatalog, stub_context, stub_update
+from module.config import Config, set_config
+from module.create_connection import get_connection, close_connections
+from module.prefix_index import market_index
+from module.find import find, app_find, market_search, SearchOptions
+from module.send_results import send_results, split_page
+from module.search import search
+from module.sell import sell
+from module.my_books import my_books
+from module.button import button
+from module.shared import MARKET, PAGE, SEARCH_PAGE, SEARCH_RESULT, SEARCHES
+
+QUERIES = ("analisi", "diritto privato", "rossi", "chim", "fondamenti informatica", "caruso giuseppe", "storia", "9788800")
+
+# searches with no exact match, answered with the similar titles and authors
+TYPOS = ("analisi matematca", "geomtria algebra", "statistca", "musumecci", "termodinamca", "dirito penale")
+
+CHAT_ID = 1
+
+
+def _stats(name: str, size: int, times: list) -> dict:
+    times = sorted(times)
+    return {
+        "name": name,
+        "size": size,
+        "n": len(times),
+        "mean_ms": statistics.fmean(times) * 1000,
+        "p50_ms": times[len(times) // 2] * 1000,
+        "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+    }
+
+
+def _timed(n: int, fn) -> list:
+    times = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _market_count() -> int:
+    with get_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM Market").fetchone()[0]
+
+
+# the catalog lookups end in other threads: the time is the one until all their sales are stored
+def _timed_catalog_sells(context, n: int, first: int) -> list:
+    before = _market_count()
+    start = time.perf_counter()
+    for i in range(n):
+        sell(stub_update(CHAT_ID, f"/vendi {isbn13(first + i)} 12,50"), context)
+    while _market_count() < before + n and time.perf_counter() - start < 60:
+        time.sleep(0.001)
+    return [(time.perf_counter() - start) / n] * n
+
+
+# pylint: disable=too-many-locals
+def run_size(size: int, repeat: int, tmp_dir: str, catalog: StubCatalog) -> list:
+    db_file = os.path.join(tmp_dir, f"bookmarket-{size}.db")
+    generate(db_file, books = max(1, size // 5), market = size, requests = max(1, size // 100))
+    set_config(Config(db_path = db_file, catalog_url = catalog.url, catalog_url_suffix = ""))
+    with get_connection() as conn:
+        market_index.build(conn)
+    # imported here, as app.py builds its caches on import
+    from app import app, search_cache # pylint: disable=import-outside-toplevel
+
+    context = stub_context(StubBot())
+    client = app.test_client()
+    results = []
+
+    def query(i):
+        return QUERIES[i % len(QUERIES)]
+
+    def record(name, times):
+        results.append(_stats(name, size, times))
+        print(f"{size:>8} {name:<28} {results[-1]['mean_ms']:9.3f} ms  p95 {results[-1]['p95_ms']:9.3f} ms")
+
+    try:
+        record("find market", _timed(repeat, lambda i: find(context, CHAT_ID, query(i), MARKET)))
+        record("find market, cheapest", _timed(repeat, lambda i: find(context, CHAT_ID, query(i), MARKET, options = SearchOptions(2000, True))))
+        record("find market, typos", _timed(repeat, lambda i: find(context, CHAT_ID, TYPOS[i % len(TYPOS)], MARKET)))
+
+        def api_find(i):
+            with get_connection() as conn:
+                app_find(query(i), conn, "Market", limit = 20)
+        record("app_find", _timed(repeat, api_find))
+
+        pages = [find(context, CHAT_ID, q, MARKET) for q in QUERIES]
+        record("send_results", _timed(repeat, lambda i: send_results(context, CHAT_ID, SEARCH_RESULT, pages[i % len(pages)], (SEARCH_PAGE, 1, 0))))
+
+        record("/cerca", _timed(repeat, lambda i: search(stub_update(CHAT_ID, "/cerca " + query(i)), context)))
+
+        # the second page of the last search of each query
+        cursors = []
+        for q in QUERIES:
+            search(stub_update(CHAT_ID, "/cerca " + q), context)
+            search_id = max(context.chat_data[SEARCHES])
+            with get_connection() as conn:
+                _, cursor = split_page(conn.execute(*market_search(q)).fetchall())
+            if cursor:
+                cursors.append(f"{PAGE};{SEARCH_PAGE};{search_id};5;{cursor}")
+        if cursors:
+            record("next page button", _timed(repeat, lambda i: button(stub_update(CHAT_ID, data = cursors[i % len(cursors)]), context)))
+
+        record("/libri", _timed(repeat, lambda i: my_books(stub_update(CHAT_ID, "/libri"), context)))
+
+        books = max(1, size // 5)
+        record("/vendi, known book", _timed(repeat, lambda i: sell(stub_update(CHAT_ID, f"/vendi {isbn13(i % books)} 10"), context)))
+        record("/vendi, catalog lookup", _timed_catalog_sells(context, repeat, 5_000_000 + size))
+
+        def api(i, cold):
+            if cold:
+                search_cache.clear()
+            client.get(f"/search?q={query(i)}&limit=20")
+        record("/search api, cold", _timed(repeat, lambda i: api(i, True)))
+        record("/search api, cached", _timed(repeat, lambda i: api(i, False)))
+        etags = {q: client.get(f"/search?q={q}&limit=20").headers["ETag"] for q in QUERIES}
+        record("/search api, 304", _timed(repeat, lambda i: client.get(f"/search?q={query(i)}&limit=20", headers = {"If-None-Match": etags[query(i)]})))
+        record("/suggest api", _timed(repeat, lambda i: client.get(f"/suggest?q={query(i)[:4]}")))
+    finally:
+        close_connections()
+    return results
+
+
+def _metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version, "machine": platform.machine()}
+
+
+# prints how much slower (> 1) or faster (< 1) every benchmark got
+def compare(results: list, previous_file: str) -> None:
+    with open(previous_file, "r", encoding = "utf-8") as previous:
+        old = {(r["name"], r["size"]): r for r in json.load(previous)["results"]}
+    print(f"\ncompared with {previous_file}")
+    for result in results:
+        before = old.get((result["name"], result["size"]))
+        if before and before["mean_ms"]:
+            ratio = result["mean_ms"] / before["mean_ms"]
+            print(f"{result['size']:>8} {result['name']:<28} {before['mean_ms']:9.3f} -> {result['mean_ms']:9.3f} ms  x{ratio:.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Benchmark the bot's handlers and the /search API")
+    parser.add_argument("--sizes", default = "1000,10000,100000", help = "Market rows of each database, comma separated")
+    parser.add_argument("--repeat", type = int, default = 200)
+    parser.add_argument("--latency", type = float, default = 0.05, help = "seconds the stub catalog takes to answer")
+    parser.add_argument("--output", help = "JSON file to write the results to")
+    parser.add_argument("--compare", help = "JSON file written by a previous run")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    catalog = StubCatalog(args.latency)
+    results = []
+    try:
+        for size in (int(size) for size in args.sizes.split(",")):
+            results += run_size(size, args.repeat, tmp_dir, catalog)
+    finally:
+        catalog.close()
+        shutil.rmtree(tmp_dir)
+
+    if args.output:
+        with open(args.output, "w", encoding = "utf-8") as output:
+            json.dump({"metadata": _metadata(), "results": results}, output, indent = 2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
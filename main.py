@@ -1,21 +1,46 @@
 # -*- coding: utf-8 -*-
 import logging
-import yaml
+import secrets
+import threading
 from app import app
-from telegram.ext import Updater
+from telegram.ext import Updater, Defaults
+from waitress import serve
+from module.config import Config, load_config
 from module.handlers import handlers
-from module.shared import YAML_PATH
+from module.create_connection import get_connection
+from module.maintenance import schedule_jobs
+from module.migrations import migrate
+from module.prefix_index import market_index
+from module.shared import WEBHOOK_PATH
+
+
+# Telegram posts the updates to app.py, that puts them in the dispatcher's queue
+def start_webhook(updater: Updater, config: Config) -> None:
+    # a new secret at every start, Telegram is told the new url below
+    secret = secrets.token_urlsafe(32)
+    app.config.update(BOT = updater.bot, UPDATE_QUEUE = updater.update_queue, WEBHOOK_SECRET = secret)
+    updater.job_queue.start()
+    threading.Thread(target = updater.dispatcher.start, name = "dispatcher", daemon = True).start()
+    updater.bot.set_webhook(config.webhook_url.rstrip("/") + WEBHOOK_PATH + secret)
 
 
 def main() -> None:
-    with open(YAML_PATH, 'r', encoding="utf-8") as yaml_config:
-        config_map = yaml.load(yaml_config, Loader=yaml.SafeLoader)
-    updater= Updater(config_map['token'], use_context=True)
+    config = load_config()
+    # handlers run in the dispatcher's pool of config.workers threads, so a slow
+    # command doesn't hold back the updates of the other users
+    updater= Updater(config.token, use_context=True, workers=config.workers, base_url=config.api_url, defaults=Defaults(run_async=True))
     logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    with get_connection() as conn:
+        migrate(conn)
+        market_index.build(conn)
     handlers(updater)
+    schedule_jobs(updater.job_queue)
 
-    updater.start_polling()
-    app.run(port=5000, host="0.0.0.0")
+    if config.webhook_url:
+        start_webhook(updater, config)
+    else:
+        updater.start_polling()
+    serve(app, host="0.0.0.0", port=config.port, threads=config.workers)
 
 
 if __name__ == '__main__':
@@ -1,9 +1,17 @@
+import time
 from module.create_connection import connect_and_execute
+from module.price import price_cents
 from module.shared import INSERT
 from telegram.ext import CallbackContext
+from typing import Optional
 
+# returns the new listing as (chat id, ISBN, title, authors, seller, price), None if it couldn't be added.
+# The watchers of the book are told by the caller, once the listing is committed
 # pylint: disable=too-many-arguments
-def add_item(context: CallbackContext, chat_id: int, isbn: str, title: str, authors: str, username: str, price: str) -> None:
-    query = "INSERT INTO Market(ISBN, Title, Authors, Seller, Price) VALUES(?,?,?,?,?)"
-    params = (isbn, title, authors, username, price)
-    connect_and_execute(context, chat_id, query, params, INSERT)
+def add_item(context: CallbackContext, chat_id: int, isbn: str, title: str, authors: str, username: str, price: str) -> Optional[tuple]:
+    now = time.time()
+    query = "INSERT INTO Market(ISBN, Title, Authors, Seller, Price, PriceCents, ChatID, CreatedAt, LastConfirmed) VALUES(?,?,?,?,?,?,?,?,?)"
+    params = (isbn, title, authors, username, price, price_cents(price), str(chat_id), now, now)
+    if connect_and_execute(context, chat_id, query, params, INSERT, "add_item") is None:
+        return None
+    return (chat_id, isbn, title, authors, username, price)
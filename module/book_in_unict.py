@@ -1,12 +1,65 @@
-from bs4 import BeautifulSoup
-import requests
-from module.shared import URL_1, URL_2, NO_MATCHES
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from module.catalog_client import catalog, CatalogUnavailable
+from module.catalog_parser import parse_catalog_page
+from module.isbn_cache import get_cached_book, store_book, normalize_key
+from module.metrics import CATALOG_SECONDS
+from module.shared import CATALOG_WORKERS
 
+# the catalog is scraped by a few dedicated threads, so a slow catalog can't take all the dispatcher's workers
+_executor = ThreadPoolExecutor(max_workers = CATALOG_WORKERS, thread_name_prefix = "catalog")
+# lookups currently running, by normalized ISBN
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _scrape(user_isbn: str) -> tuple:
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        book = parse_catalog_page(catalog.fetch(user_isbn))
+        outcome = "found" if book is not None else "not_found"
+        return book
+    except CatalogUnavailable:
+        outcome = "unavailable"
+        raise
+    finally:
+        CATALOG_SECONDS.observe(time.perf_counter() - start, outcome)
+
+
+# returns (True, (isbn, title, authors)) if the catalog knows the book, (False, None) otherwise
 def book_in_unict(user_isbn: str) -> tuple:
-    url = (URL_1 + user_isbn + URL_2)
-    x = requests.get(url, timeout=10)
-    soup = BeautifulSoup(x.content, "html.parser")
-    check = str(soup.findAll("td"))
-    if NO_MATCHES not in check:
-        return (True, soup)
-    return (False, None)
+    cached = get_cached_book(user_isbn)
+    if cached is not None:
+        return cached
+
+    book = _scrape(user_isbn)
+    store_book(user_isbn, book)
+    return (book is not None, book)
+
+
+def _forget(key: str, future: Future) -> None:
+    with _in_flight_lock:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+
+
+# runs book_in_unict in the catalog pool. Concurrent lookups of the same ISBN share the same
+# future, so the catalog is only queried once
+def lookup_book(user_isbn: str) -> Future:
+    cached = get_cached_book(user_isbn)
+    if cached is not None:
+        future = Future()
+        future.set_result(cached)
+        return future
+
+    key = normalize_key(user_isbn)
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        if future is not None:
+            return future
+        future = _executor.submit(book_in_unict, user_isbn)
+        _in_flight[key] = future
+    future.add_done_callback(lambda done: _forget(key, done))
+    return future
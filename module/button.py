@@ -1,10 +1,15 @@
 from telegram import Update
 from telegram.ext import CallbackContext
-from module.add_book import add_book
-from module.add_item import add_item
 from module.create_connection import connect_and_execute
-from module.shared import NEW_REQUEST,ADMIN_REQUEST_ACCEPTED,ADMIN_REQUEST_DECLINED,USER_REQUEST_ACCEPTED,USER_REQUEST_DECLINED,CASCADE_REQUEST,NO,YES,SELECT,DELETE,DELETING,DELETED
-from module.manage_requests import delete_request, update_similar_requests
+from module.shared import NEW_REQUEST,ADMIN_REQUEST_ACCEPTED,ADMIN_REQUEST_DECLINED,CASCADE_REQUEST,NO,YES,DELETE,DELETING,DELETED,PAGE,SEARCH_PAGE,PENDING_PAGE,PENDING,UNWATCH,WATCH_REMOVED,CONFIRM,LISTING_CONFIRMED
+from module.maintenance import confirm_listing
+from module.manage_requests import accept_request, decline_request
+from module.my_books import show_user_books
+from module.pending import show_pending, pending_action
+from module.search import show_search
+from module.send_results import is_valid_cursor
+from module.message_queue import queue_message
+from module.watchlist import remove_watch
 
 
 def button(update: Update, context: CallbackContext) -> None:
@@ -15,32 +20,41 @@ def button(update: Update, context: CallbackContext) -> None:
     if operation == DELETE:
         sql = "DELETE FROM Market WHERE rowid=?"
         _, q = query.data.split(';')
-        connect_and_execute(context, chat_id, sql, (int(q),), DELETE)
+        connect_and_execute(context, chat_id, sql, (int(q),), DELETE, "delete_listing")
         query.edit_message_text(text = DELETING)
-        context.bot.send_message(chat_id, DELETED)
+        queue_message(context, chat_id, DELETED)
+
+    if operation == PAGE:
+        _, kind, arg, shown, cursor = query.data.split(';')
+        query.answer()
+        # a cursor that can't be read starts over from the first page
+        if not is_valid_cursor(cursor):
+            shown, cursor = 0, ""
+        if kind == SEARCH_PAGE:
+            show_search(context, chat_id, int(arg), int(shown), cursor, query)
+        elif kind == PENDING_PAGE:
+            show_pending(context, chat_id, int(shown), cursor, query)
+        else:
+            show_user_books(context, chat_id, kind, int(shown), cursor, query)
+
+    if operation == CONFIRM:
+        _, row_id = query.data.split(';')
+        confirm_listing(chat_id, int(row_id))
+        query.edit_message_text(text = LISTING_CONFIRMED)
+
+    if operation == UNWATCH:
+        _, watch_id = query.data.split(';')
+        remove_watch(chat_id, int(watch_id))
+        query.edit_message_text(text = WATCH_REMOVED)
 
     if operation == NEW_REQUEST:
         _, vote, row_id = query.data.split(';')
-        sql = "SELECT rowid, * FROM Requests WHERE rowid=?"
-        rows = connect_and_execute(context, chat_id, sql, (int(row_id),), SELECT)
-
-        if rows:
-
-            if vote == YES:
-                _, chat_id, isbn, title, authors, username, price = rows[0]
-                query.edit_message_text(text = ADMIN_REQUEST_ACCEPTED)
-                add_book(context, chat_id, isbn, title, authors)
-                add_item(context, chat_id, isbn, title, authors, username, price)
-                delete_request(context, int(row_id))
-                update_similar_requests(context, isbn)
-                context.bot.send_message(chat_id, USER_REQUEST_ACCEPTED)
-
-            if vote == NO:
-                chat_id = rows[0][1]
-                query.edit_message_text(text = ADMIN_REQUEST_DECLINED)
-                delete_request(context, int(row_id))
-                context.bot.send_message(chat_id, USER_REQUEST_DECLINED)
+        # the request may have been approved already, along with another one for the same book
+        if vote == YES:
+            query.edit_message_text(text = ADMIN_REQUEST_ACCEPTED if accept_request(context, int(row_id)) else CASCADE_REQUEST)
 
-        else:
-            if vote in [YES, NO]:
-                query.edit_message_text(text = CASCADE_REQUEST)
+        if vote == NO:
+            query.edit_message_text(text = ADMIN_REQUEST_DECLINED if decline_request(context, int(row_id)) else CASCADE_REQUEST)
+
+    if operation == PENDING:
+        pending_action(context, chat_id, query)
@@ -0,0 +1,110 @@
+import logging
+import random
+import threading
+import time
+from typing import Optional
+import requests
+from module.config import get_config
+from module.shared import CATALOG_RETRIES, CATALOG_BACKOFF, CATALOG_FAILURES, CATALOG_RESET
+
+logger = logging.getLogger(__name__)
+
+
+# raised without contacting the catalog while it is considered down.
+# It is a RequestException, so it is handled like the catalog's own errors
+class CatalogUnavailable(requests.RequestException):
+    pass
+
+
+# after `failures` lookups in a row have failed the circuit opens, and the lookups fail right away
+# for `reset_after` seconds. Then a single lookup is let through: if it succeeds the circuit closes,
+# otherwise it stays open for another `reset_after` seconds
+class CircuitBreaker:
+    def __init__(self, failures: int, reset_after: float) -> None:
+        self.failures = failures
+        self.reset_after = reset_after
+        self._failed = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.reset_after:
+                return False
+            self._trial = True
+            return True
+
+    def success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("The catalog is reachable again")
+            self._failed, self._opened_at, self._trial = 0, None, False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._failed += 1
+            if self._trial or (self._opened_at is None and self._failed >= self.failures):
+                if self._opened_at is None:
+                    logger.warning("The catalog failed %d times in a row, lookups are suspended", self._failed)
+                self._opened_at, self._trial = time.monotonic(), False
+
+
+# fetches the catalog's pages over keep-alive connections (a Session for each of the catalog
+# threads, as a Session isn't thread safe), retrying a few times the requests that didn't reach it
+# pylint: disable=too-few-public-methods
+class CatalogClient:
+    def __init__(self, breaker: Optional[CircuitBreaker] = None) -> None:
+        self.breaker = breaker or CircuitBreaker(CATALOG_FAILURES, CATALOG_RESET)
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _get(self, url: str) -> bytes:
+        config = get_config()
+        response = self._session().get(url, timeout = (config.catalog_connect_timeout, config.catalog_timeout))
+        # the catalog (or its proxy) is overloaded or restarting
+        if response.status_code >= 500:
+            raise requests.HTTPError(f"{response.status_code} from the catalog", response = response)
+        return response.content
+
+    # the search page of the ISBN. A read timeout is not retried, as a slow catalog would
+    # only get slower, while failed connections and server errors are retried after a jittered backoff
+    def fetch(self, isbn: str) -> bytes:
+        if not self.breaker.allow():
+            raise CatalogUnavailable("the catalog is not available")
+
+        # every lookup let through ends with a success or a failure, whatever it raised:
+        # otherwise a failed trial would leave the circuit half-open for good
+        succeeded = False
+        try:
+            content = self._fetch(isbn)
+            succeeded = True
+            return content
+        finally:
+            if succeeded:
+                self.breaker.success()
+            else:
+                self.breaker.failure()
+
+    def _fetch(self, isbn: str) -> bytes:
+        config = get_config()
+        url = config.catalog_url + isbn + config.catalog_url_suffix
+        error = None
+        for attempt in range(CATALOG_RETRIES + 1):
+            if attempt:
+                time.sleep(CATALOG_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            try:
+                return self._get(url)
+            except (requests.ConnectionError, requests.HTTPError) as e:
+                error = e
+        raise error
+
+
+catalog = CatalogClient()
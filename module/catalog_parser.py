@@ -0,0 +1,42 @@
+import re
+from typing import Optional
+from bs4 import BeautifulSoup, SoupStrainer
+from module.isbn import canonical_isbn
+from module.shared import NO_MATCHES, ISBN_PREFIX_1, ISBN_PREFIX_2
+
+# only the record's fields (the title in <strong> is one of them) are turned into a tree,
+# the rest of the page is tokenized and thrown away
+RECORD_FIELDS = SoupStrainer("td", class_ = "bibInfoData")
+
+_NO_MATCHES = NO_MATCHES.encode()
+
+
+def _clean_isbn(isbn: str) -> str:
+    isbn = isbn.replace('-', '')
+    if len(isbn) > 13:
+        for prefix in (ISBN_PREFIX_1, ISBN_PREFIX_2):
+            p = re.search(prefix, isbn)
+            if p is not None:
+                s = p.span()[0]
+                return isbn[s:s+13]
+    return isbn
+
+
+# extracts (isbn, title, authors) from a catalog search page, None if the search had no matches.
+# The ISBN is the first line of the last "bibInfoData" field, the title and authors are
+# in the first <strong>, separated by "/"
+def parse_catalog_page(content: bytes) -> Optional[tuple]:
+    if _NO_MATCHES in content:
+        return None
+
+    soup = BeautifulSoup(content, "html.parser", parse_only = RECORD_FIELDS)
+    fields = soup.find_all("td")
+    strong = soup.find("strong")
+    if not fields or strong is None:
+        # not a record page: don't let it be cached as a miss
+        raise ValueError("Unexpected catalog page")
+
+    isbn = fields[-1].get_text().strip().split("\n")[0].strip()
+    title, _, authors = strong.get_text().partition("/")
+    isbn = _clean_isbn(isbn)
+    return (canonical_isbn(isbn) or isbn, title.strip(), authors.strip())
@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import Field, dataclass, fields
+from typing import Optional
+import yaml
+from module.shared import YAML_PATH, DB_PATH, URL_1, URL_2, CATALOG_CONNECT_TIMEOUT, CATALOG_TIMEOUT, BUSY_TIMEOUT, NEGATIVE_CACHE_TTL, CONFIG_CHECK_INTERVAL, TELEGRAM_API_URL, WORKERS, PORT, LISTING_TTL_DAYS, REMINDER_DAYS
+
+logger = logging.getLogger(__name__)
+
+
+# settings.yaml, with the defaults of the optional settings
+# pylint: disable=too-many-instance-attributes
+@dataclass(frozen = True)
+class Config:
+    token: str = ""
+    admin_group_id: Optional[int] = None
+    db_path: str = DB_PATH
+    catalog_url: str = URL_1
+    catalog_url_suffix: str = URL_2
+    catalog_connect_timeout: float = CATALOG_CONNECT_TIMEOUT
+    catalog_timeout: float = CATALOG_TIMEOUT
+    busy_timeout: float = BUSY_TIMEOUT
+    negative_cache_ttl: float = NEGATIVE_CACHE_TTL
+    # queries slower than this are logged, 0 to disable the log
+    slow_query_ms: float = 0
+    # updates are received through a webhook on this public url (e.g. "https://example.org")
+    # instead of long polling, if it is set
+    webhook_url: str = ""
+    api_url: str = TELEGRAM_API_URL
+    workers: int = WORKERS
+    port: int = PORT
+    # the books on sale are deleted after this many days without a confirmation, 0 to keep them
+    listing_ttl_days: float = LISTING_TTL_DAYS
+    reminder_days: float = REMINDER_DAYS
+    # the new requests are sent to the admins all together, once the oldest has waited
+    # this many minutes, instead of one message each; 0 to send them right away
+    digest_minutes: float = 0
+
+
+_lock = threading.Lock()
+_config = None
+# the file the configuration is reloaded from when it changes, None if it was set with set_config
+_path = YAML_PATH
+_mtime = None
+_checked = 0.0
+
+
+# the value converted to the type of the field, e.g. "5" for a float field; ValueError if it can't be
+def _coerce(field: Field, value):
+    kind = int if field.type == Optional[int] else field.type
+    if isinstance(value, bool) and kind is not bool:
+        raise ValueError(f"{field.name} must be {kind.__name__}, not {value!r}")
+    try:
+        converted = kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field.name} must be {kind.__name__}, not {value!r}") from None
+    # int(4.5) would silently drop the decimals
+    if kind is int and isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"{field.name} must be int, not {value!r}")
+    return converted
+
+
+def _read(path: str) -> Config:
+    with open(path, 'r', encoding = 'utf-8') as yaml_config:
+        config_map = yaml.load(yaml_config, Loader = yaml.SafeLoader) or {}
+    return Config(**{field.name: _coerce(field, config_map[field.name]) for field in fields(Config) if config_map.get(field.name) not in (None, "")})
+
+
+def load_config(path: str = YAML_PATH) -> Config:
+    global _config, _path, _mtime, _checked
+    with _lock:
+        _path, _mtime, _checked = path, os.stat(path).st_mtime_ns, time.monotonic()
+        _config = _read(path)
+        return _config
+
+
+# uses the given configuration instead of the file's one, e.g. in benchmarks
+def set_config(config: Config) -> None:
+    global _config, _path
+    with _lock:
+        _config, _path = config, None
+
+
+# the current configuration. The file is parsed again only if it was modified,
+# and its modification time is checked at most once every CONFIG_CHECK_INTERVAL seconds
+def get_config() -> Config:
+    global _config, _mtime, _checked
+    if _config is None:
+        return load_config(_path or YAML_PATH)
+
+    now = time.monotonic()
+    if _path is None or now - _checked < CONFIG_CHECK_INTERVAL:
+        return _config
+
+    with _lock:
+        _checked = now
+        try:
+            mtime = os.stat(_path).st_mtime_ns
+            if mtime != _mtime:
+                _config, _mtime = _read(_path), mtime
+                logger.info("Configuration reloaded from %s", _path)
+        except (OSError, yaml.YAMLError) as e:
+            # e.g. the file is being written: keep using the last valid configuration
+            logger.warning("Could not reload %s: %s", _path, e)
+        except (TypeError, ValueError) as e:
+            logger.error("Invalid configuration in %s, the previous one is kept: %s", _path, e)
+        return _config
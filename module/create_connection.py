@@ -1,40 +1,202 @@
+import logging
+import queue
+import re
 import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
 from sqlite3 import Error
-from module.shared import DB_PATH, DB_ERROR, INSERT, DELETE, SELECT
+from module.config import get_config
+from module.isbn import canonical_isbn
+from module.message_queue import queue_message
+from module.price import price_cents
+from module.metrics import QUERY_SECONDS, QUERY_ROWS
+from module.text_fold import fold
+from module.shared import DB_ERROR, INSERT, DELETE, SELECT, POOL_SIZE, STATEMENT_CACHE_SIZE
 from telegram.ext import CallbackContext
-from typing import Optional, Union
+from typing import Iterator, Optional, Union
+
+# pragmas applied to every new connection. WAL lets the Flask app read while a
+# dispatcher thread is writing, and "synchronous=NORMAL" is safe in WAL mode
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+)
+
+# the Python functions that the triggers and the migrations call, registered on every connection
+SQL_FUNCTIONS = (
+    ("fold", fold),
+    ("canonical_isbn", canonical_isbn),
+    ("price_cents", price_cents),
+)
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+_local = threading.local()
+# connections that never write, used to read PRAGMA data_version
+_monitors = {}
+_monitors_lock = threading.Lock()
+
+
+def register_functions(conn: sqlite3.Connection) -> None:
+    for name, function in SQL_FUNCTIONS:
+        conn.create_function(name, 1, function, deterministic = True)
+
 
 def create_connection(db_file: str) -> sqlite3.Connection:
     conn = None
     try:
-        conn = sqlite3.connect(db_file)
+        # isolation_level=None: every statement outside of transaction() commits on its own,
+        # while transaction() issues an explicit BEGIN/COMMIT around several statements.
+        # The timeout is how long a statement waits for a lock held by another connection
+        conn = sqlite3.connect(db_file, timeout = get_config().busy_timeout, isolation_level = None,
+                               check_same_thread = False, cached_statements = STATEMENT_CACHE_SIZE)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        register_functions(conn)
     except Error as e:
         print(str(e))
     return conn
 
 
-# pylint: disable=inconsistent-return-statements
-def connect_and_execute(context: CallbackContext, chat_id: int, query: str, params: tuple, operation: str) -> Optional[Union[int, list]]:
-    conn = create_connection(DB_PATH)
-    if not conn:
-        context.bot.send_message(chat_id, DB_ERROR)
-        return
+def _get_pool(db_file: str) -> queue.LifoQueue:
+    with _pools_lock:
+        if db_file not in _pools:
+            _pools[db_file] = queue.LifoQueue(maxsize = POOL_SIZE)
+        return _pools[db_file]
 
-    cur = conn.cursor()
-    cur.execute(query, params)
-    if operation == INSERT:
-        conn.commit()
-        last_row_id = cur.lastrowid
-        conn.close()
-        return last_row_id
 
-    if operation == DELETE:
-        conn.commit()
+def _acquire(db_file: str) -> Optional[sqlite3.Connection]:
+    try:
+        return _get_pool(db_file).get_nowait()
+    except queue.Empty:
+        return create_connection(db_file)
+
+
+def _release(db_file: str, conn: sqlite3.Connection) -> None:
+    try:
+        _get_pool(db_file).put_nowait(conn)
+    except queue.Full:
         conn.close()
+
+
+def close_connections() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        while not pool.empty():
+            pool.get_nowait().close()
+    with _monitors_lock:
+        for conn in _monitors.values():
+            conn.close()
+        _monitors.clear()
+
+
+# a number that changes whenever a change to the database is committed (by this process or
+# any other one), None if the database could not be opened. data_version only reflects the
+# commits of the other connections, so it is read from a connection that never writes
+def data_version(db_file: str = None) -> Optional[int]:
+    db_file = db_file or get_config().db_path
+    with _monitors_lock:
+        conn = _monitors.get(db_file)
+        if conn is None:
+            conn = _monitors[db_file] = create_connection(db_file)
+        if conn is None:
+            del _monitors[db_file]
+            return None
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+# borrows a pooled connection, or reuses the one bound to the current transaction().
+# Yields None if the database could not be opened
+@contextmanager
+def get_connection(db_file: str = None) -> Iterator[Optional[sqlite3.Connection]]:
+    db_file = db_file or get_config().db_path
+    pinned = getattr(_local, "conn", None)
+    if pinned is not None:
+        yield pinned
         return
 
-    if operation == SELECT:
-        rows = cur.fetchall()
-        conn.close()
-        return rows
-        
\ No newline at end of file
+    conn = _acquire(db_file)
+    try:
+        yield conn
+    finally:
+        if conn is not None:
+            _release(db_file, conn)
+
+
+# every query issued by the current thread inside the block (including the ones made
+# through connect_and_execute) runs in a single transaction, committed once at the end.
+# Nested blocks join the outermost transaction
+@contextmanager
+def transaction(db_file: str = None) -> Iterator[sqlite3.Connection]:
+    if getattr(_local, "conn", None) is not None:
+        yield _local.conn
+        return
+
+    db_file = db_file or get_config().db_path
+    conn = _acquire(db_file)
+    if conn is None:
+        raise Error(DB_ERROR)
+
+    _local.conn = conn
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        _local.conn = None
+        _release(db_file, conn)
+
+
+# the label of the metrics of a query without a name: a hash of the query, where a list of placeholders
+# of any length counts as one, so that the labels are as many as the queries in the code
+@lru_cache(maxsize = 256)
+def _query_label(query: str) -> str:
+    shape = re.sub(r"\?(\s*,\s*\?)+", "?", " ".join(query.split()))
+    return f"sql_{zlib.crc32(shape.encode()):08x}"
+
+
+# pylint: disable=too-many-arguments
+def _record(query: str, params: tuple, operation: str, elapsed: float, rows: int, name: Optional[str]) -> None:
+    label = name or _query_label(query)
+    QUERY_SECONDS.observe(elapsed, operation, label)
+    QUERY_ROWS.inc(operation, label, amount = max(rows, 0))
+    slow_query_ms = get_config().slow_query_ms
+    if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+        logger.warning("Slow query %s (%.1f ms, %d rows): %s %s", label, elapsed * 1000, rows, " ".join(query.split()), params)
+
+
+# name is the label of the query's metrics (see module.metrics)
+# pylint: disable=inconsistent-return-statements
+def connect_and_execute(context: CallbackContext, chat_id: int, query: str, params: tuple, operation: str, name: Optional[str] = None) -> Optional[Union[int, list]]:
+    with get_connection() as conn:
+        if not conn:
+            queue_message(context, chat_id, DB_ERROR)
+            return
+
+        start = time.perf_counter()
+        cur = conn.execute(query, params)
+        # the rows of a SELECT are only read by fetchall, so it is timed too
+        rows = cur.fetchall() if operation == SELECT else None
+        _record(query, params, operation, time.perf_counter() - start, len(rows) if rows is not None else cur.rowcount, name)
+
+        if operation == INSERT:
+            return cur.lastrowid
+
+        if operation == DELETE:
+            return
+
+        if operation == SELECT:
+            return rows
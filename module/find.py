@@ -1,28 +1,188 @@
-from typing import Union
+import math
+import re
+from typing import NamedTuple, Optional, Union
 import sqlite3
 from telegram.ext import CallbackContext
 from module.create_connection import connect_and_execute
-from module.shared import BOOKS, SELECT
+from module.isbn import canonical_isbn
+from module.price import price_cents
+from module.send_results import decode_cursor
+from module.shared import BOOKS, SELECT, PAGE_SIZE, FUZZY_CANDIDATES, FUZZY_THRESHOLD, FUZZY_KEY
+from module.text_fold import fold
 
+# the bound of the searches without a maximum price
+NO_MAX_PRICE = 2 ** 63 - 1
 
-def find(context: CallbackContext, chat_id: int, txt: str, mode: str) -> Union[int, list, None]:
+# the books whose price isn't a number only match the searches without a maximum price
+PRICE_FILTER = f"ifnull(m.PriceCents, {NO_MAX_PRICE}) <= ?"
+
+# ranked with bm25: a match in the title weighs more than one in the authors or ISBN.
+# The score is selected last, as the sort key of the keyset pagination
+MARKET_MATCHES = "SELECT m.rowid AS Id, m.ISBN, m.Title, m.Authors, m.Seller, m.Price, " \
+                 "bm25(MarketFTS, 10.0, 5.0, 1.0) AS SortKey FROM MarketFTS " \
+                 f"JOIN Market m ON m.rowid = MarketFTS.rowid WHERE MarketFTS MATCH ? AND {PRICE_FILTER}"
+
+MARKET_SEARCH = f"SELECT * FROM ({MARKET_MATCHES}) ORDER BY SortKey, Id LIMIT ?"
+
+MARKET_SEARCH_AFTER = f"SELECT * FROM ({MARKET_MATCHES}) " \
+                      "WHERE SortKey > ? OR (SortKey = ? AND Id > ?) ORDER BY SortKey, Id LIMIT ?"
+
+# the matches read from the Market_PriceCents index, cheapest first: the scan stops after a page,
+# without sorting all the matches. The unary + keeps the planner from looking them up by rowid instead.
+# The books whose price isn't a number (NULL cents) are left out
+MARKET_BY_PRICE = "SELECT m.rowid AS Id, m.ISBN, m.Title, m.Authors, m.Seller, m.Price, m.PriceCents AS SortKey FROM Market m " \
+                  "WHERE +m.rowid IN (SELECT rowid FROM MarketFTS WHERE MarketFTS MATCH ?) AND m.PriceCents <= ?"
+
+MARKET_CHEAPEST = f"{MARKET_BY_PRICE} ORDER BY m.PriceCents, m.rowid LIMIT ?"
+
+MARKET_CHEAPEST_AFTER = f"{MARKET_BY_PRICE} AND (m.PriceCents, m.rowid) > (?, ?) ORDER BY m.PriceCents, m.rowid LIMIT ?"
+
+# the rows sharing at least a trigram with the search, the most likely to be similar first
+MARKET_FUZZY = "SELECT m.rowid AS Id, m.ISBN, m.Title, m.Authors, m.Seller, m.Price, t.Text FROM MarketTrigrams t " \
+               f"JOIN Market m ON m.rowid = t.rowid WHERE MarketTrigrams MATCH ? AND {PRICE_FILTER} ORDER BY bm25(MarketTrigrams) LIMIT ?"
+
+TRIGRAM_COUNTS = "SELECT term, doc FROM MarketTrigramsVocab WHERE term IN ({})"
+
+
+# the filters of a Market search: the highest price, in cents, and whether the cheapest books come first
+class SearchOptions(NamedTuple):
+    max_cents: Optional[int] = None
+    by_price: bool = False
+
+
+# splits "/cerca" text like "analisi max:20 ordina:prezzo" in the words to look for and their options.
+# The options that can't be understood are left among the words
+def parse_search(txt: str) -> tuple:
+    words, max_cents, by_price = [], None, False
+    for word in txt.split():
+        name, _, value = word.partition(":")
+        if name.lower() == "max" and price_cents(value) is not None:
+            max_cents = price_cents(value)
+        elif name.lower() == "ordina" and value.lower() == "prezzo":
+            by_price = True
+        else:
+            words.append(word)
+    return " ".join(words), SearchOptions(max_cents, by_price)
+
+
+def fts_query(txt: str) -> str:
+    # "978-88-..." is looked up as a single ISBN token
+    txt = re.sub(r"(?<=\d)-(?=\d)", "", txt)
+    # every word must match, as a prefix of a word in the title, authors or ISBN.
+    # The ISBNs are stored as ISBN-13, so a whole ISBN-10 is looked up as its ISBN-13
+    return " ".join(f'"{canonical_isbn(word) or word}"*' for word in re.findall(r"\w+", txt))
+
+
+# the query and parameters of a page of Market results after cursor; a page holds
+# up to limit rows (all of them if limit is None), plus one to tell whether there is another page
+def market_search(txt: str, cursor: Optional[str] = None, limit: Optional[int] = PAGE_SIZE, options: SearchOptions = SearchOptions()) -> Optional[tuple]:
+    match = fts_query(txt)
+    if not match:
+        return None
+    limit = limit + 1 if limit is not None else -1
+    max_cents = options.max_cents if options.max_cents is not None else NO_MAX_PRICE
+    after = decode_cursor(cursor)
+    if options.by_price:
+        if after is None:
+            return MARKET_CHEAPEST, (match, max_cents, limit)
+        return MARKET_CHEAPEST_AFTER, (match, max_cents) + after + (limit,)
+    if after is None:
+        return MARKET_SEARCH, (match, max_cents, limit)
+    key, row_id = after
+    return MARKET_SEARCH_AFTER, (match, max_cents, key, key, row_id, limit)
+
+
+def _trigrams(txt: str) -> set:
+    return {word[i:i + 3] for word in re.findall(r"\w+", fold(txt)) for i in range(len(word) - 2)}
+
+
+# the query and parameters of how many rows have each trigram of the search, None if it is too short
+def trigram_counts(txt: str) -> Optional[tuple]:
+    trigrams = sorted(_trigrams(txt))
+    if not trigrams:
+        return None
+    return TRIGRAM_COUNTS.format(",".join("?" * len(trigrams))), tuple(trigrams)
+
+
+# the query and parameters of the candidates for a search with typos, given the trigram_counts rows.
+# A row similar enough has at least `needed` of the n trigrams of the search, so it has one of
+# the n - needed + 1 rarest ones too: the common trigrams can be left out of the query
+def fuzzy_search(txt: str, counts: list, options: SearchOptions = SearchOptions()) -> Optional[tuple]:
+    trigrams = _trigrams(txt)
+    counts = dict(counts)
+    needed = math.ceil(FUZZY_THRESHOLD * len(trigrams))
+    rarest = sorted(trigrams, key = lambda trigram: counts.get(trigram, 0))[:len(trigrams) - needed + 1]
+    rarest = [trigram for trigram in rarest if counts.get(trigram)]
+    if not rarest:
+        return None
+    max_cents = options.max_cents if options.max_cents is not None else NO_MAX_PRICE
+    return MARKET_FUZZY, (" OR ".join(f'"{trigram}"' for trigram in rarest), max_cents, FUZZY_CANDIDATES)
+
+
+# a page of the candidates similar enough to the search, after cursor. The sort key of a row is
+# FUZZY_KEY minus its similarity: mostly the share of the search's trigrams found in the row
+# (so a typo costs a couple of trigrams), then how few other trigrams the row has
+def rank_fuzzy(candidates: list, txt: str, cursor: Optional[str] = None, limit: Optional[int] = PAGE_SIZE) -> list:
+    trigrams = _trigrams(txt)
+    after = decode_cursor(cursor)
+    rows = []
+    for row in candidates:
+        row_trigrams = _trigrams(row[-1])
+        common = len(trigrams & row_trigrams)
+        if not trigrams or common / len(trigrams) < FUZZY_THRESHOLD:
+            continue
+        similarity = 0.9 * common / len(trigrams) + 0.1 * common / len(trigrams | row_trigrams)
+        key = round(FUZZY_KEY - similarity, 6)
+        if after is None or (key, row[0]) > after:
+            rows.append(row[:-1] + (key,))
+    rows.sort(key = lambda row: (row[-1], row[0]))
+    return rows if limit is None else rows[:limit + 1]
+
+
+# the similar results are only looked for when the search has no exact match, and is sorted by
+# relevance. Their pages have cursors above FUZZY_KEY - 1, while the exact ones are never positive
+def _wants_fuzzy(cursor: Optional[str], options: SearchOptions) -> bool:
+    after = decode_cursor(cursor)
+    return not options.by_price and (after is None or after[0] > 0)
+
+
+# pylint: disable=too-many-arguments
+def find(context: CallbackContext, chat_id: int, txt: str, mode: str, cursor: Optional[str] = None, limit: int = PAGE_SIZE,
+         options: SearchOptions = SearchOptions()) -> Union[int, list, None]:
     if mode == BOOKS:
         query = "SELECT * FROM Books WHERE ISBN=?"
         params = (txt,)
     else:
-        q = f"%{txt}%"
-        query = "SELECT rowid, * FROM Market WHERE Title LIKE ? OR ISBN Like ? OR Authors LIKE ?"
-        params = (q, q, q,)
+        search = market_search(txt, cursor, limit, options)
+        if search is None:
+            return []
+        query, params = search
 
-    return connect_and_execute(context, chat_id, query, params, SELECT)
+    rows = connect_and_execute(context, chat_id, query, params, SELECT, "find_book" if mode == BOOKS else "market_search")
+    if mode != BOOKS and rows == [] and _wants_fuzzy(cursor, options):
+        counts = trigram_counts(txt)
+        search = fuzzy_search(txt, connect_and_execute(context, chat_id, *counts, SELECT, "trigram_counts") or [], options) if counts else None
+        if search is not None:
+            candidates = connect_and_execute(context, chat_id, *search, SELECT, "fuzzy_search")
+            rows = rank_fuzzy(candidates, txt, cursor, limit) if candidates else candidates
+    return rows
 
 
-def app_find(txt: str, conn: sqlite3.Connection, s: str) -> list[tuple]:
+# pylint: disable=too-many-arguments
+def app_find(txt: str, conn: sqlite3.Connection, s: str, cursor: Optional[str] = None, limit: Optional[int] = None,
+             options: SearchOptions = SearchOptions()) -> list[tuple]:
     cur = conn.cursor()
     if s == "Books":
         cur.execute("SELECT * FROM Books WHERE ISBN=?", (txt,))
     else:
-        q = "%" + txt + "%"
-        cur.execute("SELECT rowid, * FROM Market WHERE Title LIKE ? OR ISBN Like ? OR Authors LIKE ?", (q, q, q,))
+        search = market_search(txt, cursor, limit, options)
+        if search is None:
+            return []
+        cur.execute(*search)
     rows = cur.fetchall()
+    if s != "Books" and not rows and _wants_fuzzy(cursor, options):
+        counts = trigram_counts(txt)
+        search = fuzzy_search(txt, cur.execute(*counts).fetchall(), options) if counts else None
+        if search is not None:
+            rows = rank_fuzzy(cur.execute(*search).fetchall(), txt, cursor, limit)
     return rows
@@ -1,21 +1,33 @@
-from telegram.ext import Updater, CommandHandler, CallbackQueryHandler
+from telegram import Update
+from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, InlineQueryHandler, TypeHandler
 from module.start import start
 from module.help import help # pylint: disable=redefined-builtin
 from module.search import search
+from module.inline_search import inline_search
 from module.sell import sell
 from module.delete import delete
 from module.my_books import my_books
 from module.request import request
 from module.button import button
+from module.usernames import remember_user
+from module.watchlist import watch
+from module.pending import pending
+from module.metrics import instrumented
 
 
 def handlers(updater: Updater) -> None:
     dispatcher = updater.dispatcher
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(CommandHandler("help", help))
-    dispatcher.add_handler(CommandHandler("vendi", sell))
-    dispatcher.add_handler(CommandHandler("cerca", search))
-    dispatcher.add_handler(CommandHandler("elimina", delete))
-    dispatcher.add_handler(CommandHandler("libri", my_books))
-    dispatcher.add_handler(CommandHandler("richiedi", request))
-    dispatcher.add_handler(CallbackQueryHandler(button))
+    # the time spent in each command is exported on /metrics (see app.py)
+    # not run_async: the username must be known before the command runs
+    dispatcher.add_handler(TypeHandler(Update, remember_user, run_async = False), group = -1)
+    dispatcher.add_handler(CommandHandler("start", instrumented("start", start)))
+    dispatcher.add_handler(CommandHandler("help", instrumented("help", help)))
+    dispatcher.add_handler(CommandHandler("vendi", instrumented("vendi", sell)))
+    dispatcher.add_handler(CommandHandler("cerca", instrumented("cerca", search)))
+    dispatcher.add_handler(CommandHandler("elimina", instrumented("elimina", delete)))
+    dispatcher.add_handler(CommandHandler("libri", instrumented("libri", my_books)))
+    dispatcher.add_handler(CommandHandler("richiedi", instrumented("richiedi", request)))
+    dispatcher.add_handler(CommandHandler("avvisami", instrumented("avvisami", watch)))
+    dispatcher.add_handler(CommandHandler("pending", instrumented("pending", pending)))
+    dispatcher.add_handler(CallbackQueryHandler(instrumented("button", button)))
+    dispatcher.add_handler(InlineQueryHandler(instrumented("inline", inline_search)))
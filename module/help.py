@@ -1,12 +1,14 @@
 from telegram import Update
 from telegram.ext import CallbackContext
+from module.message_queue import queue_message
 
 # pylint: disable=redefined-builtin
 def help(update: Update, context: CallbackContext) -> None:
     chat_id = update.effective_chat.id
     sell = "/vendi <ISBN> <Prezzo>\nAggiungi un libro alla lista degli oggetti in vendita. Inserisci l'ISBN del tuo libro e il prezzo con il quale lo vorresti vendere.\nEs: /vendi 9788891296566 5.50\n\n"
-    search = "/cerca <txt>\nCerca un libro all'interno della lista degli oggetti in vendita. La ricerca si baserà su ciò che hai inserito successivamente al comando. All'interno dei risultati della ricerca sono presenti sia le informazioni sui libri sia il contatto della persona che l'ha messo in vendita.\nEs: /cerca modelli matematici\n\n"
+    search = "/cerca <txt>\nCerca un libro all'interno della lista degli oggetti in vendita. La ricerca si baserà su ciò che hai inserito successivamente al comando. All'interno dei risultati della ricerca sono presenti sia le informazioni sui libri sia il contatto della persona che l'ha messo in vendita.\nAggiungendo max:<Prezzo> vengono mostrati solo i libri che costano al più quel prezzo, con ordina:prezzo i libri più economici vengono mostrati per primi.\nEs: /cerca modelli matematici\nEs: /cerca modelli matematici max:20 ordina:prezzo\n\n"
     delete = "/elimina\nElimina un libro che avevi precedentemente inserito nella lista degli oggetti in vendita. Puoi utilizzare questo comando, ad esempio, quando avrai venduto il tuo libro o se non vorrai più venderlo.\nEs: /elimina\n\n"
     books = "/libri\nElenca i tuoi libri in vendita.\nEs: /libri\n\n"
+    watch = "/avvisami <ISBN|parole chiave>\nRicevi un messaggio quando viene messo in vendita un libro con quell'ISBN o che contiene tutte le parole chiave nel titolo o negli autori. Senza argomenti, elenca i tuoi avvisi e permette di eliminarli.\nEs: /avvisami analisi matematica\n\n"
     request = "/richiedi <ISBN>; <Prezzo>; <Titolo>; <Autori>\nRichiedi l'inserimento manuale di un libro non presente nei database locali e/o online. Un admin controllerà la tua richiesta e aggiungerà manualmente il libro agli altri oggetti in vendita.\nNota bene: ogni campo deve essere separato dal carattere ';' seguito da uno spazio.\nEs: /richiedi 9788864201795; 4.08; One Piece 1; Eiichiro Oda"
-    context.bot.send_message(chat_id, "Comandi disponibili:\n\n" + sell + search + delete + books + request)
+    queue_message(context, chat_id, "Comandi disponibili:\n\n" + sell + search + delete + books + watch + request)
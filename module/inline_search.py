@@ -0,0 +1,47 @@
+from telegram import InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.ext import CallbackContext
+from module.create_connection import get_connection
+from module.find import app_find, fts_query, parse_search
+from module.result_cache import ResultCache
+from module.send_results import get_item_info, split_page, is_valid_cursor
+from module.shared import INLINE_PAGE_SIZE, INLINE_CACHE_SIZE, INLINE_CACHE_TTL, MIN_QUERY_LENGTH
+
+# pages of results by (search, options, cursor). An inline query is sent at every keystroke,
+# and the same query by many users: the pages are kept for INLINE_CACHE_TTL seconds, the same
+# time Telegram is told it can keep them, so a new book shows up at most that late
+_pages = ResultCache(INLINE_CACHE_SIZE, ttl = INLINE_CACHE_TTL)
+
+
+def _article(row: tuple) -> InlineQueryResultArticle:
+    row_id, isbn, title, authors, seller, price = row[:6]
+    return InlineQueryResultArticle(id = str(row_id), title = title, description = f"{authors}\n{price} € - {seller}",
+                                    input_message_content = InputTextMessageContent(get_item_info(isbn, title, authors, seller, price)))
+
+
+# a page of results and the cursor of the next one, None at the last page
+def _page(txt: str, cursor: str) -> tuple:
+    txt, options = parse_search(txt)
+    key = (fts_query(txt).lower(), options, cursor)
+    page = _pages.get(key)
+    if page is None:
+        with get_connection() as conn:
+            rows = app_find(txt, conn, "Market", cursor or None, INLINE_PAGE_SIZE, options) if conn else []
+        rows, next_cursor = split_page(rows, INLINE_PAGE_SIZE)
+        page = ([_article(row) for row in rows], next_cursor)
+        _pages.put(key, page)
+    return page
+
+
+# "@bot <txt>" in any chat: the books on sale matching txt, the same as "/cerca <txt>".
+# Telegram asks for the next page with the offset of the previous answer, here the keyset cursor
+def inline_search(update: Update, _: CallbackContext) -> None:
+    inline_query = update.inline_query
+    txt = inline_query.query.strip()
+    if len(txt) < MIN_QUERY_LENGTH:
+        inline_query.answer([], cache_time = INLINE_CACHE_TTL)
+        return
+
+    # an offset that isn't one of our cursors asks for the first page
+    offset = inline_query.offset if is_valid_cursor(inline_query.offset) else ""
+    results, next_cursor = _page(txt, offset)
+    inline_query.answer(results, next_offset = next_cursor or "", cache_time = INLINE_CACHE_TTL)
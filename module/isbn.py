@@ -0,0 +1,28 @@
+import re
+from typing import Optional
+from module.shared import ISBN_PREFIX_1
+
+# the books are stored, cached and looked up by their ISBN-13, whichever form the user typed:
+# "88-08-12345-X", "8808123456" and "978-88-08-..." are all the same book
+
+
+def _isbn10_check(digits: str) -> str:
+    check = (11 - sum((10 - i) * int(d) for i, d in enumerate(digits[:9]))) % 11
+    return "X" if check == 10 else str(check)
+
+
+def _isbn13_check(digits: str) -> str:
+    return str((10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits[:12]))) % 10)
+
+
+# the ISBN-13 of a valid ISBN-10 or ISBN-13 (spaces and hyphens are ignored), None if txt isn't one
+def canonical_isbn(txt: str) -> Optional[str]:
+    isbn = re.sub(r"[\s-]", "", str(txt or "")).upper()
+    if re.fullmatch(r"\d{9}[\dX]", isbn):
+        if isbn[9] != _isbn10_check(isbn):
+            return None
+        isbn = ISBN_PREFIX_1 + isbn[:9]
+        return isbn + _isbn13_check(isbn)
+    if re.fullmatch(r"\d{13}", isbn) and isbn[12] == _isbn13_check(isbn):
+        return isbn
+    return None
@@ -0,0 +1,78 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from module.config import get_config
+from module.create_connection import get_connection
+from module.isbn import canonical_isbn
+from module.metrics import CATALOG_CACHE_LOOKUPS
+from module.shared import CATALOG_CACHE_SIZE
+
+# results of the catalog lookups, keyed by the ISBN-13 of the ISBN the user typed.
+# A book is stored as (isbn, title, authors) and never expires; a miss is stored
+# as None and is retried after negative_cache_ttl seconds
+_lru = OrderedDict()
+_lock = threading.Lock()
+
+
+def normalize_key(isbn: str) -> str:
+    return canonical_isbn(isbn) or re.sub(r"[^0-9X]", "", isbn.upper())
+
+
+def _is_fresh(book: Optional[tuple], fetched_at: float) -> bool:
+    return book is not None or time.time() - fetched_at < get_config().negative_cache_ttl
+
+
+def _remember(key: str, book: Optional[tuple], fetched_at: float) -> None:
+    with _lock:
+        _lru[key] = (book, fetched_at)
+        _lru.move_to_end(key)
+        while len(_lru) > CATALOG_CACHE_SIZE:
+            _lru.popitem(last = False)
+
+
+def _load(key: str) -> Optional[tuple]:
+    with get_connection() as conn:
+        if not conn:
+            return None
+        row = conn.execute("SELECT BookISBN, Title, Authors, FetchedAt FROM CatalogCache WHERE ISBN=?", (key,)).fetchone()
+    if row is None:
+        return None
+    book_isbn, title, authors, fetched_at = row
+    return ((book_isbn, title, authors) if book_isbn is not None else None, fetched_at)
+
+
+# returns (True, book) or (False, None) for a cached hit or miss, None if the catalog has to be queried
+def get_cached_book(isbn: str) -> Optional[tuple]:
+    key = normalize_key(isbn)
+    result = "memory_hit"
+    with _lock:
+        entry = _lru.get(key)
+        if entry is not None:
+            _lru.move_to_end(key)
+
+    if entry is None:
+        result = "db_hit"
+        entry = _load(key)
+        if entry is not None:
+            _remember(key, *entry)
+
+    if entry is None or not _is_fresh(*entry):
+        CATALOG_CACHE_LOOKUPS.inc("miss")
+        return None
+
+    book, _ = entry
+    CATALOG_CACHE_LOOKUPS.inc(result if book is not None else "negative_hit")
+    return (book is not None, book)
+
+
+def store_book(isbn: str, book: Optional[tuple]) -> None:
+    key = normalize_key(isbn)
+    fetched_at = time.time()
+    _remember(key, book, fetched_at)
+    book_isbn, title, authors = book if book is not None else (None, None, None)
+    with get_connection() as conn:
+        if conn:
+            conn.execute("INSERT OR REPLACE INTO CatalogCache(ISBN, BookISBN, Title, Authors, FetchedAt) VALUES(?,?,?,?,?)",
+                         (key, book_isbn, title, authors, fetched_at))
@@ -0,0 +1,94 @@
+import logging
+import time
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import CallbackContext, JobQueue
+from module.config import get_config
+from module.create_connection import get_connection, transaction
+from module.message_queue import queue_message
+from module.metrics import instrumented
+from module.pending import send_digest
+from module.send_results import get_item_info
+from module.shared import DAY, EXPIRY_INTERVAL, MAINTENANCE_INTERVAL, DIGEST_CHECK_INTERVAL, EXPIRY_BATCH, FTS_MERGE_PAGES, MARKET_LOG_KEEP, CONFIRM, DELETE_APPROVED, LISTING_REMINDER, LISTING_EXPIRED, STILL_ON_SALE, SOLD
+
+logger = logging.getLogger(__name__)
+
+LISTING = "SELECT rowid, ChatID, ISBN, Title, Authors, Seller, Price FROM Market "
+
+# the listings to confirm: the oldest first, through Market_LastConfirmed
+TO_REMIND = LISTING + "WHERE LastConfirmed < ? AND RemindedAt IS NULL AND ChatID IS NOT NULL ORDER BY LastConfirmed LIMIT ?"
+
+# the expired listings whose seller has been asked at least reminder_days ago (or can't be asked)
+EXPIRED = LISTING + "WHERE LastConfirmed < ? AND (ChatID IS NULL OR RemindedAt < ?) ORDER BY LastConfirmed LIMIT ?"
+
+
+def _reminder_keyboard(row_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton(STILL_ON_SALE, callback_data = f"{CONFIRM};{row_id}"),
+                                  InlineKeyboardButton(SOLD, callback_data = DELETE_APPROVED + str(row_id))]])
+
+
+# the listing is on sale for another listing_ttl_days. Only its seller can confirm it
+def confirm_listing(chat_id: int, row_id: int) -> None:
+    with get_connection() as conn:
+        conn.execute("UPDATE Market SET LastConfirmed=?, RemindedAt=NULL WHERE rowid=? AND ChatID=?", (time.time(), row_id, str(chat_id)))
+
+
+# asks the sellers to confirm the listings about to expire, then deletes the expired ones.
+# Each batch is a transaction of its own, so the handlers are never locked out for long
+def expire_listings(context: CallbackContext) -> None:
+    config = get_config()
+    if not config.listing_ttl_days:
+        return
+    now = time.time()
+    expiry = now - config.listing_ttl_days * DAY
+    notice = min(config.reminder_days, config.listing_ttl_days) * DAY
+
+    while True:
+        with transaction() as conn:
+            rows = conn.execute(TO_REMIND, (expiry + notice, EXPIRY_BATCH)).fetchall()
+            conn.executemany("UPDATE Market SET RemindedAt=? WHERE rowid=?", ((now, row[0]) for row in rows))
+        for row_id, chat_id, *item in rows:
+            queue_message(context, chat_id, LISTING_REMINDER.format(round(notice / DAY)) + get_item_info(*item), _reminder_keyboard(row_id))
+        if len(rows) < EXPIRY_BATCH:
+            break
+
+    expired = 0
+    while True:
+        with transaction() as conn:
+            rows = conn.execute(EXPIRED, (expiry, now - notice, EXPIRY_BATCH)).fetchall()
+            conn.executemany("DELETE FROM Market WHERE rowid=?", ((row[0],) for row in rows))
+        for _, chat_id, *item in rows:
+            if chat_id is not None:
+                queue_message(context, chat_id, LISTING_EXPIRED + get_item_info(*item))
+        expired += len(rows)
+        if len(rows) < EXPIRY_BATCH:
+            break
+    if expired:
+        logger.info("%d expired listings deleted", expired)
+
+
+# keeps the query planner's statistics and the full-text indexes in shape, and trims what is no
+# longer needed. Every step is bounded, as the handlers wait for it if they have to write
+def maintain_database(_: CallbackContext) -> None:
+    with get_connection() as conn:
+        if not conn:
+            logger.warning("Database maintenance skipped: no connection")
+            return
+        # the statistics are only gathered again for the tables that changed enough
+        conn.execute("PRAGMA optimize")
+        # each write adds a segment to the full-text indexes: merging a few pages at a time
+        # keeps the searches fast, without the long lock of a full 'optimize'
+        conn.execute("INSERT INTO MarketFTS(MarketFTS, rank) VALUES('merge', ?)", (FTS_MERGE_PAGES,))
+        conn.execute("INSERT INTO MarketTrigrams(MarketTrigrams, rank) VALUES('merge', ?)", (FTS_MERGE_PAGES,))
+        # the catalog misses are retried after negative_cache_ttl anyway
+        conn.execute("DELETE FROM CatalogCache WHERE BookISBN IS NULL AND FetchedAt < ?", (time.time() - get_config().negative_cache_ttl,))
+        # only the latest changes are kept for the indexes that are behind: one further behind
+        # is built again (see module.prefix_index)
+        conn.execute("DELETE FROM MarketLog WHERE Id <= (SELECT MAX(Id) FROM MarketLog) - ?", (MARKET_LOG_KEEP,))
+    logger.info("Database maintenance done")
+
+
+# the jobs run in the job queue's threads, away from the updates
+def schedule_jobs(job_queue: JobQueue) -> None:
+    job_queue.run_repeating(instrumented("expire_listings", expire_listings), interval = EXPIRY_INTERVAL, first = 60)
+    job_queue.run_repeating(instrumented("maintain_database", maintain_database), interval = MAINTENANCE_INTERVAL, first = 5 * 60)
+    job_queue.run_repeating(instrumented("send_digest", send_digest), interval = DIGEST_CHECK_INTERVAL, first = DIGEST_CHECK_INTERVAL)
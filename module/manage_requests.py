@@ -1,56 +1,84 @@
-import yaml
+import time
+from typing import List
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
-from module.create_connection import connect_and_execute
-from module.add_item import add_item
-from module.find import find
+from module.config import get_config
+from module.create_connection import connect_and_execute, transaction
+from module.price import PRICE_CENTS_SQL
 from module.send_results import get_item_info
-from module.shared import YAML_PATH,NEW_REQUEST_APPROVED,NEW_REQUEST_DECLINED,PENDING_REQUEST,NO,YES,INSERT,SELECT,DELETE,ON_SALE_CONFIRM,BOOKS
+from module.shared import NEW_REQUEST_APPROVED,NEW_REQUEST_DECLINED,PENDING_REQUEST,USER_REQUEST_ACCEPTED,USER_REQUEST_DECLINED,ON_SALE_CONFIRM,NO,YES,INSERT,SELECT
+from module.message_queue import queue_message
+from module.watchlist import notify_watchers
 
 
 def get_group_id() -> int:
-    with open(YAML_PATH, 'r', encoding='utf-8') as yaml_config:
-        config_map = yaml.load(yaml_config, Loader = yaml.SafeLoader)
-    return int(config_map['admin_group_id'])
+    return get_config().admin_group_id
 
 
+# out of digest mode the request is sent to the admins right away (see send_request), so it is
+# stored as notified already: the digest job, that flushes the requests still waiting, can't send it twice
 # pylint: disable=too-many-arguments
 def add_request(context: CallbackContext, chat_id: int, isbn: str, title: str, authors: str, username: str, price: str) -> int:
-    item = (str(chat_id), isbn, title, authors, username, price)
-    query = "INSERT INTO Requests(ChatID, ISBN, Title, Authors, Seller, Price) VALUES(?,?,?,?,?,?)"
-    return connect_and_execute(context, chat_id, query, item, INSERT)
-
-
-def delete_request(context: CallbackContext, row_id: int) -> None:
-    query = "DELETE FROM Requests WHERE rowid=?"
-    connect_and_execute(context, get_group_id(), query, (row_id,), DELETE)
+    now = time.time()
+    item = (str(chat_id), isbn, title, authors, username, price, now, None if get_config().digest_minutes else now)
+    query = "INSERT INTO Requests(ChatID, ISBN, Title, Authors, Seller, Price, RequestedAt, NotifiedAt) VALUES(?,?,?,?,?,?,?,?)"
+    return connect_and_execute(context, chat_id, query, item, INSERT, "add_request")
 
 
+# a request stored in digest mode (NotifiedAt is NULL) waits for the next digest (see module.pending)
 def send_request(context: CallbackContext, row_id: int) -> None:
     group_id = get_group_id()
 
     keyboard = [[InlineKeyboardButton(YES, callback_data = (NEW_REQUEST_APPROVED + str(row_id)))], [InlineKeyboardButton(NO, callback_data = (NEW_REQUEST_DECLINED + str(row_id)))]]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    query = "SELECT ISBN, Title, Authors, Seller, Price FROM Requests WHERE rowid=?"
-    rows = connect_and_execute(context, group_id, query, (row_id,), SELECT) #maybe (row_id,)
-
-    isbn, title, authors, username, price = rows[0]
-    context.bot.send_message(group_id, PENDING_REQUEST + get_item_info(isbn, title, authors, username, price), reply_markup = reply_markup)
-
-
-def update_similar_requests(context: CallbackContext, isbn: str) -> None:
-    group_id = get_group_id()
-
-    query = "SELECT rowid, ChatID, Seller, Price FROM Requests WHERE ISBN=?"
-    rows = connect_and_execute(context, group_id, query, (isbn,), SELECT)   # maybe (isbn,)
-
-    book_info = find(context, group_id, isbn, BOOKS)
-    _, title, authors = book_info[0]
-
-    # pylint: disable=consider-using-enumerate
-    for i in range(len(rows)):
-        row_id, chat_id, username, price = rows[i]
-        add_item(context, chat_id, isbn, title, authors, username, price)
-        delete_request(context, row_id)
-        context.bot.send_message(chat_id, ON_SALE_CONFIRM)
+    query = "SELECT ISBN, Title, Authors, Seller, Price, NotifiedAt FROM Requests WHERE rowid=?"
+    rows = connect_and_execute(context, group_id, query, (row_id,), SELECT, "get_request") #maybe (row_id,)
+
+    isbn, title, authors, username, price, notified_at = rows[0]
+    if notified_at is None:
+        return
+    queue_message(context, group_id, PENDING_REQUEST + get_item_info(isbn, title, authors, username, price), reply_markup = reply_markup)
+
+
+# moves the request, and every other pending request for the same book, from Requests to Market
+# in a single transaction. Returns the approved requests as (chat id, ISBN, title, authors, seller, price),
+# the given one first, for the users (and the watchers of the book) to be notified once the changes are committed
+def approve_request(row_id: int) -> List[tuple]:
+    with transaction() as conn:
+        row = conn.execute("SELECT ISBN, Title, Authors FROM Requests WHERE rowid=?", (row_id,)).fetchone()
+        if row is None:
+            return []
+        isbn, title, authors = row
+
+        # the book may have been added in the meantime: its data wins over the request's one
+        conn.execute("INSERT OR IGNORE INTO Books(ISBN, Title, Authors) VALUES(?,?,?)", (isbn, title, authors))
+        title, authors = conn.execute("SELECT Title, Authors FROM Books WHERE ISBN=?", (isbn,)).fetchone()
+
+        approved = [(chat_id, isbn, title, authors, seller, price) for chat_id, seller, price in
+                    conn.execute("SELECT ChatID, Seller, Price FROM Requests WHERE ISBN=? ORDER BY rowid<>?, rowid", (isbn, row_id))]
+        now = time.time()
+        conn.execute("INSERT INTO Market(ISBN, Title, Authors, Seller, Price, PriceCents, ChatID, CreatedAt, LastConfirmed) "
+                     f"SELECT ISBN, ?, ?, Seller, Price, {PRICE_CENTS_SQL.format('Price')}, ChatID, ?, ? FROM Requests WHERE ISBN=?", (title, authors, now, now, isbn))
+        conn.execute("DELETE FROM Requests WHERE ISBN=?", (isbn,))
+    return approved
+
+
+# approves the request and tells its user, the other users that requested the same book and the
+# watchers of the book. False if the request was already approved or declined
+def accept_request(context: CallbackContext, row_id: int) -> bool:
+    approved = approve_request(row_id)
+    for i, listing in enumerate(approved):
+        queue_message(context, listing[0], USER_REQUEST_ACCEPTED if i == 0 else ON_SALE_CONFIRM)
+    notify_watchers(context, approved)
+    return bool(approved)
+
+
+def decline_request(context: CallbackContext, row_id: int) -> bool:
+    with transaction() as conn:
+        row = conn.execute("SELECT ChatID FROM Requests WHERE rowid=?", (row_id,)).fetchone()
+        if row is None:
+            return False
+        conn.execute("DELETE FROM Requests WHERE rowid=?", (row_id,))
+    queue_message(context, row[0], USER_REQUEST_DECLINED)
+    return True
@@ -0,0 +1,203 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+from telegram import Bot, ReplyMarkup
+from telegram.error import BadRequest, RetryAfter, NetworkError, TelegramError
+from telegram.ext import CallbackContext
+from module.metrics import MESSAGES
+from module.shared import GLOBAL_RATE, CHAT_RATE, GROUP_RATE, MESSAGE_MAX_LENGTH, SEND_RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # seconds to wait before a token is available
+    def delay(self, now: float) -> float:
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+# messages are sent by a single thread, that keeps every chat under its Telegram limit
+# (about one message per second in private chats, twenty per minute in groups) and the
+# bot under the global one. Chats with pending messages are served round robin, so a long
+# burst to one chat doesn't delay the others
+# pylint: disable=too-many-instance-attributes
+class MessageQueue:
+    def __init__(self) -> None:
+        self._pending = {}
+        self._ready = deque()
+        self._buckets = {}
+        self._global = TokenBucket(*GLOBAL_RATE)
+        self._paused_until = 0.0
+        # (failed attempts, not before) of the chats whose first message couldn't be sent
+        self._retries = {}
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def put(self, bot: Bot, chat_id: int, text: str, reply_markup: Optional[ReplyMarkup] = None) -> None:
+        # Requests stores the chat ids as text
+        chat_id = int(chat_id)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target = self._run, name = "message_queue", daemon = True)
+                self._thread.start()
+            messages = self._pending.get(chat_id)
+            if messages is None:
+                messages = self._pending[chat_id] = deque()
+                self._ready.append(chat_id)
+            messages.append((bot, text, reply_markup))
+            self._cond.notify()
+
+    # waits until every queued message has been sent, False on timeout
+    def join(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # group and channel ids are negative
+            bucket = self._buckets[chat_id] = TokenBucket(*(GROUP_RATE if int(chat_id) < 0 else CHAT_RATE))
+        return bucket
+
+    # the first chat that can receive a message now, or how long to wait for one
+    def _next_chat(self, now: float) -> tuple:
+        wait = max(self._paused_until - now, self._global.delay(now))
+        if wait > 0:
+            return None, wait
+        for _ in range(len(self._ready)):
+            chat_id = self._ready[0]
+            self._ready.rotate(-1)
+            delay = self._bucket(chat_id).delay(now)
+            retry = self._retries.get(chat_id)
+            if retry is not None:
+                delay = max(delay, retry[1] - now)
+            if delay == 0:
+                return chat_id, 0
+            wait = delay if wait == 0 else min(wait, delay)
+        return None, wait
+
+    # consecutive plain texts to the same chat are sent as a single message
+    def _pop(self, chat_id: int) -> tuple:
+        messages = self._pending[chat_id]
+        bot, text, reply_markup = messages.popleft()
+        while reply_markup is None and messages:
+            next_bot, next_text, next_markup = messages[0]
+            if next_markup is not None or next_bot is not bot or len(text) + len(next_text) + 2 > MESSAGE_MAX_LENGTH:
+                break
+            text += "\n\n" + next_text
+            messages.popleft()
+        return bot, text, reply_markup
+
+    def _done(self, chat_id: int) -> None:
+        if not self._pending[chat_id]:
+            del self._pending[chat_id]
+            self._ready.remove(chat_id)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                chat_id, wait = None, None
+                while chat_id is None:
+                    if not self._pending:
+                        self._prune()
+                        self._cond.wait()
+                        continue
+                    chat_id, wait = self._next_chat(time.monotonic())
+                    if chat_id is None:
+                        self._cond.wait(wait)
+                now = time.monotonic()
+                self._global.take(now)
+                self._bucket(chat_id).take(now)
+                message = self._pop(chat_id)
+                self._in_flight += 1
+
+            try:
+                retry = self._send(chat_id, *message)
+            # pylint: disable=broad-except
+            except Exception:
+                # this is the only thread sending messages: it must outlive any message
+                logger.exception("Message to %s dropped", chat_id)
+                MESSAGES.inc("dropped")
+                with self._cond:
+                    self._retries.pop(chat_id, None)
+                retry = False
+
+            with self._cond:
+                self._in_flight -= 1
+                if retry:
+                    self._pending[chat_id].appendleft(message)
+                else:
+                    self._done(chat_id)
+                self._cond.notify_all()
+
+    # a single attempt at sending the message, returns True if it has to be sent again
+    def _send(self, chat_id: int, bot: Bot, text: str, reply_markup: Optional[ReplyMarkup]) -> bool:
+        try:
+            bot.send_message(chat_id, text, reply_markup = reply_markup)
+            MESSAGES.inc("sent")
+        except RetryAfter as e:
+            # flood control: nothing is sent until Telegram allows it again
+            logger.warning("Flood limit reached, retrying in %ss", e.retry_after)
+            MESSAGES.inc("flood_wait")
+            with self._cond:
+                self._paused_until = time.monotonic() + float(e.retry_after)
+            return True
+        except BadRequest as e:
+            # a NetworkError in python-telegram-bot, but sending it again would fail the same way
+            # (e.g. the message is too long or the chat doesn't exist)
+            logger.warning("Message to %s dropped: %s", chat_id, e)
+            MESSAGES.inc("dropped")
+        except NetworkError as e:
+            attempts = self._retries.get(chat_id, (0, 0.0))[0] + 1
+            if attempts < SEND_RETRIES:
+                # only this chat waits for the backoff, the others are still served
+                logger.warning("Sending to %s failed (%s), attempt %d", chat_id, e, attempts)
+                MESSAGES.inc("retried")
+                with self._cond:
+                    self._retries[chat_id] = (attempts, time.monotonic() + 2 ** (attempts - 1))
+                return True
+            logger.warning("Message to %s dropped after %d attempts", chat_id, SEND_RETRIES)
+            MESSAGES.inc("dropped")
+        except TelegramError as e:
+            # e.g. the user blocked the bot: there is no point in retrying
+            logger.warning("Message to %s dropped: %s", chat_id, e)
+            MESSAGES.inc("dropped")
+        with self._cond:
+            self._retries.pop(chat_id, None)
+        return False
+
+    # forgets the buckets of idle chats
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, bucket in self._buckets.items() if bucket.is_full(now)]:
+            del self._buckets[chat_id]
+
+
+message_queue = MessageQueue()
+
+
+# queues a message for the chat, instead of sending it from the handler's thread
+def queue_message(context: CallbackContext, chat_id: int, text: str, reply_markup: Optional[ReplyMarkup] = None) -> None:
+    message_queue.put(context.bot, chat_id, text, reply_markup)
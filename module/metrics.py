@@ -0,0 +1,118 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Tuple
+from module.shared import LATENCY_BUCKETS
+
+# counters and histograms of the bot, served by app.py on /metrics in the Prometheus text format
+_registry = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> ([count of each bucket], sum, count)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            counts, total, count = self._values.get(label_values) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[label_values] = (counts, total + value, count + 1)
+
+    # observes the seconds spent in the block
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket = _labels(self.labels, label_values, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+                bucket = _labels(self.labels, label_values, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{bucket} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {count}")
+        return "\n".join(lines)
+
+
+HANDLER_SECONDS = Histogram("bookmarket_handler_seconds", "Time spent handling an update, by handler", ("handler",))
+
+HANDLER_ERRORS = Counter("bookmarket_handler_errors_total", "Updates whose handler raised an exception, by handler", ("handler",))
+
+QUERY_SECONDS = Histogram("bookmarket_query_seconds", "Time spent running a query through connect_and_execute, by operation and query name", ("operation", "query"))
+
+QUERY_ROWS = Counter("bookmarket_query_rows_total", "Rows returned (SELECT) or changed (INSERT, DELETE) by connect_and_execute", ("operation", "query"))
+
+CATALOG_CACHE_LOOKUPS = Counter("bookmarket_catalog_cache_lookups_total", "Catalog lookups by result of the cache: memory_hit, db_hit, negative_hit (a cached miss) or miss", ("result",))
+
+CATALOG_SECONDS = Histogram("bookmarket_catalog_fetch_seconds", "Time spent fetching a page of the university catalog, by outcome", ("outcome",))
+
+MESSAGES = Counter("bookmarket_messages_total", "Outgoing messages by result: sent, dropped, retried (network errors) or flood_wait", ("result",))
+
+
+# the callback with its time and errors recorded, under the given name
+def instrumented(name: str, callback: Callable) -> Callable:
+    @functools.wraps(callback)
+    def wrapper(*args, **kwargs):
+        try:
+            with HANDLER_SECONDS.time(name):
+                return callback(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+    return wrapper
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in _registry) + "\n"
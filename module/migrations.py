@@ -0,0 +1,215 @@
+import logging
+import sqlite3
+from module.create_connection import register_functions
+from module.price import PRICE_CENTS_SQL
+
+logger = logging.getLogger(__name__)
+
+# full-text index over Market, kept in sync by triggers. It is an external content
+# table, so the text is only stored once (in Market) and the index maps back to Market's rowid
+MARKET_FTS = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS MarketFTS USING fts5(
+        Title, Authors, ISBN,
+        content = 'Market', content_rowid = 'rowid',
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS Market_fts_insert AFTER INSERT ON Market BEGIN
+        INSERT INTO MarketFTS(rowid, Title, Authors, ISBN) VALUES (new.rowid, new.Title, new.Authors, new.ISBN);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS Market_fts_delete AFTER DELETE ON Market BEGIN
+        INSERT INTO MarketFTS(MarketFTS, rowid, Title, Authors, ISBN) VALUES ('delete', old.rowid, old.Title, old.Authors, old.ISBN);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS Market_fts_update AFTER UPDATE ON Market BEGIN
+        INSERT INTO MarketFTS(MarketFTS, rowid, Title, Authors, ISBN) VALUES ('delete', old.rowid, old.Title, old.Authors, old.ISBN);
+        INSERT INTO MarketFTS(rowid, Title, Authors, ISBN) VALUES (new.rowid, new.Title, new.Authors, new.ISBN);
+    END""",
+    # index the rows that were already in the database
+    "INSERT INTO MarketFTS(MarketFTS) VALUES ('rebuild')",
+)
+
+LOOKUP_INDEXES = (
+    # only the oldest of duplicated requests is kept, so that uniqueness can be enforced
+    "DELETE FROM Requests WHERE rowid NOT IN (SELECT MIN(rowid) FROM Requests GROUP BY ISBN, Seller)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS Requests_ISBN_Seller ON Requests(ISBN, Seller)",
+    "CREATE INDEX IF NOT EXISTS Market_Seller ON Market(Seller)",
+)
+
+# catalog lookups, including misses (BookISBN is NULL), see module.isbn_cache
+CATALOG_CACHE = (
+    """CREATE TABLE IF NOT EXISTS CatalogCache (
+        ISBN text PRIMARY KEY,
+        BookISBN text,
+        Title text,
+        Authors text,
+        FetchedAt real NOT NULL
+    )""",
+)
+
+# every change to the titles, authors and ISBNs on sale, so that in-memory indexes
+# (see module.prefix_index) can catch up without reading the whole Market again
+MARKET_LOG = (
+    """CREATE TABLE IF NOT EXISTS MarketLog (
+        Id INTEGER PRIMARY KEY AUTOINCREMENT,
+        Op text NOT NULL,
+        Title text,
+        Authors text,
+        ISBN text
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS Market_log_insert AFTER INSERT ON Market BEGIN
+        INSERT INTO MarketLog(Op, Title, Authors, ISBN) VALUES ('+', new.Title, new.Authors, new.ISBN);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS Market_log_delete AFTER DELETE ON Market BEGIN
+        INSERT INTO MarketLog(Op, Title, Authors, ISBN) VALUES ('-', old.Title, old.Authors, old.ISBN);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS Market_log_update AFTER UPDATE OF Title, Authors, ISBN ON Market BEGIN
+        INSERT INTO MarketLog(Op, Title, Authors, ISBN) VALUES ('-', old.Title, old.Authors, old.ISBN);
+        INSERT INTO MarketLog(Op, Title, Authors, ISBN) VALUES ('+', new.Title, new.Authors, new.ISBN);
+    END""",
+)
+
+# trigrams of the titles and authors on sale, lowercase and without accents, for the searches
+# with typos (see module.find). The text is folded by text_fold.fold, registered as the SQL
+# function fold() on every connection (see create_connection.register_functions): a client
+# that doesn't register it can't write to Market
+MARKET_TEXT = "fold(coalesce(new.Title, '') || ' ' || coalesce(new.Authors, ''))"
+
+MARKET_TRIGRAMS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS MarketTrigrams USING fts5(Text, tokenize = 'trigram')",
+    # how many rows have each trigram
+    "CREATE VIRTUAL TABLE IF NOT EXISTS MarketTrigramsVocab USING fts5vocab(MarketTrigrams, row)",
+    f"""CREATE TRIGGER IF NOT EXISTS Market_trigrams_insert AFTER INSERT ON Market BEGIN
+        INSERT INTO MarketTrigrams(rowid, Text) VALUES (new.rowid, {MARKET_TEXT});
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS Market_trigrams_delete AFTER DELETE ON Market BEGIN
+        DELETE FROM MarketTrigrams WHERE rowid = old.rowid;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS Market_trigrams_update AFTER UPDATE OF Title, Authors ON Market BEGIN
+        UPDATE MarketTrigrams SET Text = {MARKET_TEXT} WHERE rowid = new.rowid;
+    END""",
+    f"INSERT INTO MarketTrigrams(rowid, Text) SELECT rowid, {MARKET_TEXT.replace('new.', '')} FROM Market",
+)
+
+# the price in cents, for the filters and the sorting by price (see module.price). The rows
+# written without it, e.g. by older code, get it from a trigger, through the SQL function price_cents()
+MARKET_PRICES = (
+    # the full-text index only needs an update when the indexed text changes,
+    # and not for each of the rows filled in below
+    "DROP TRIGGER IF EXISTS Market_fts_update",
+    """CREATE TRIGGER IF NOT EXISTS Market_fts_update AFTER UPDATE OF Title, Authors, ISBN ON Market BEGIN
+        INSERT INTO MarketFTS(MarketFTS, rowid, Title, Authors, ISBN) VALUES ('delete', old.rowid, old.Title, old.Authors, old.ISBN);
+        INSERT INTO MarketFTS(rowid, Title, Authors, ISBN) VALUES (new.rowid, new.Title, new.Authors, new.ISBN);
+    END""",
+    "ALTER TABLE Market ADD COLUMN PriceCents INTEGER",
+    f"UPDATE Market SET PriceCents = {PRICE_CENTS_SQL.format('Price')}",
+    # the rowid is part of every index, so the cheapest books are read in (PriceCents, rowid) order
+    "CREATE INDEX IF NOT EXISTS Market_PriceCents ON Market(PriceCents)",
+    f"""CREATE TRIGGER IF NOT EXISTS Market_price_insert AFTER INSERT ON Market WHEN new.PriceCents IS NULL BEGIN
+        UPDATE Market SET PriceCents = {PRICE_CENTS_SQL.format('new.Price')} WHERE rowid = new.rowid;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS Market_price_update AFTER UPDATE OF Price ON Market BEGIN
+        UPDATE Market SET PriceCents = {PRICE_CENTS_SQL.format('new.Price')} WHERE rowid = new.rowid;
+    END""",
+)
+
+# the users to notify when a book is put on sale (see module.watchlist): by ISBN, or when all
+# the Words keywords start a word of its title, authors or ISBN. WatchWords is the inverted
+# index of the keywords, so a new book is only matched against the watches sharing one of its words
+WATCHES = (
+    """CREATE TABLE IF NOT EXISTS Watches (
+        Id INTEGER PRIMARY KEY,
+        ChatID text NOT NULL,
+        ISBN text,
+        Keywords text,
+        Words integer NOT NULL DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS Watches_ISBN ON Watches(ISBN) WHERE ISBN IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS Watches_ChatID ON Watches(ChatID)",
+    """CREATE TABLE IF NOT EXISTS WatchWords (
+        Word text NOT NULL,
+        WatchId integer NOT NULL,
+        PRIMARY KEY (Word, WatchId)
+    ) WITHOUT ROWID""",
+)
+
+# when a book was put on sale, and confirmed to be still on sale by its seller, whose chat
+# is asked to confirm it before it expires (see module.maintenance). The books already on sale
+# have no ChatID: they expire without a reminder, listing_ttl_days after this migration
+MARKET_EXPIRY = (
+    "ALTER TABLE Market ADD COLUMN ChatID text",
+    "ALTER TABLE Market ADD COLUMN CreatedAt real",
+    "ALTER TABLE Market ADD COLUMN LastConfirmed real",
+    "ALTER TABLE Market ADD COLUMN RemindedAt real",
+    "UPDATE Market SET CreatedAt = CAST(strftime('%s', 'now') AS REAL), LastConfirmed = CAST(strftime('%s', 'now') AS REAL)",
+    "CREATE INDEX IF NOT EXISTS Market_LastConfirmed ON Market(LastConfirmed)",
+    """CREATE TRIGGER IF NOT EXISTS Market_expiry_insert AFTER INSERT ON Market WHEN new.LastConfirmed IS NULL BEGIN
+        UPDATE Market SET CreatedAt = CAST(strftime('%s', 'now') AS REAL), LastConfirmed = CAST(strftime('%s', 'now') AS REAL) WHERE rowid = new.rowid;
+    END""",
+)
+
+# when a request was made, and when the admins were told about it (NULL until the next digest,
+# see module.pending). The requests already in the database have been sent to the admins
+REQUEST_DIGEST = (
+    "ALTER TABLE Requests ADD COLUMN RequestedAt real",
+    "ALTER TABLE Requests ADD COLUMN NotifiedAt real",
+    "UPDATE Requests SET RequestedAt = CAST(strftime('%s', 'now') AS REAL), NotifiedAt = CAST(strftime('%s', 'now') AS REAL)",
+    "CREATE INDEX IF NOT EXISTS Requests_NotifiedAt ON Requests(NotifiedAt)",
+)
+
+# every ISBN becomes the ISBN-13 it stands for (see module.isbn); the ones that aren't valid are
+# left as they are. Of the books and requests that turn out to be the same, only the oldest is kept
+CANONICAL_ISBNS = (
+    "DELETE FROM Books WHERE rowid NOT IN (SELECT MIN(rowid) FROM Books GROUP BY coalesce(canonical_isbn(ISBN), ISBN))",
+    "UPDATE Books SET ISBN = canonical_isbn(ISBN) WHERE canonical_isbn(ISBN) <> ISBN",
+    "UPDATE Market SET ISBN = canonical_isbn(ISBN) WHERE canonical_isbn(ISBN) <> ISBN",
+    "DELETE FROM Requests WHERE rowid NOT IN (SELECT MIN(rowid) FROM Requests GROUP BY coalesce(canonical_isbn(ISBN), ISBN), Seller)",
+    "UPDATE Requests SET ISBN = canonical_isbn(ISBN) WHERE canonical_isbn(ISBN) <> ISBN",
+    "UPDATE Watches SET ISBN = canonical_isbn(ISBN) WHERE canonical_isbn(ISBN) <> ISBN",
+    "UPDATE CatalogCache SET BookISBN = canonical_isbn(BookISBN) WHERE canonical_isbn(BookISBN) <> BookISBN",
+    # the lookups of an ISBN-10 and of its ISBN-13 now share an entry: the ISBN-13 one is kept
+    "DELETE FROM CatalogCache WHERE canonical_isbn(ISBN) <> ISBN AND canonical_isbn(ISBN) IN (SELECT ISBN FROM CatalogCache)",
+    "UPDATE CatalogCache SET ISBN = canonical_isbn(ISBN) WHERE canonical_isbn(ISBN) <> ISBN",
+)
+
+# the books and requests of a chat, whose username is kept up to date (see module.usernames)
+SELLER_CHATS = (
+    "CREATE INDEX IF NOT EXISTS Market_ChatID ON Market(ChatID)",
+    "CREATE INDEX IF NOT EXISTS Requests_ChatID ON Requests(ChatID)",
+)
+
+# the n-th entry upgrades the database from user_version n to n + 1.
+# Append new migrations at the end, never edit the ones already released
+MIGRATIONS = (
+    MARKET_FTS,
+    LOOKUP_INDEXES,
+    CATALOG_CACHE,
+    MARKET_LOG,
+    MARKET_TRIGRAMS,
+    MARKET_PRICES,
+    WATCHES,
+    MARKET_EXPIRY,
+    REQUEST_DIGEST,
+    CANONICAL_ISBNS,
+    SELLER_CHATS,
+)
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> None:
+    version = get_version(conn)
+    # e.g. a connection opened by the benchmarks
+    register_functions(conn)
+    for target, statements in enumerate(MIGRATIONS[version:], start = version + 1):
+        # each migration is applied atomically, together with the version bump
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version={target}")
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info("Database migrated to version %d", target)
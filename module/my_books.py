@@ -1,34 +1,41 @@
 from typing import List, Optional
-from telegram import Update
+from telegram import CallbackQuery, Update
 from telegram.ext import CallbackContext
-from module.create_connection import connect_and_execute, create_connection
-from module.shared import DB_PATH,DB_ERROR,MY_BOOKS_USAGE,SELECT,LIST_BOOKS,NO_BOOKS
-from module.send_results import send_results
+from module.create_connection import connect_and_execute
+from module.shared import MY_BOOKS_USAGE,SELECT,LIST_BOOKS,NO_BOOKS,PAGE_SIZE,BOOKS_PAGE,SELECT_BOOK_TO_DELETE
+from module.send_results import send_results, decode_cursor
+from module.message_queue import queue_message
+from module.usernames import get_username
 
 
-# pylint: disable=inconsistent-return-statements
-def get_user_books(context: CallbackContext, chat_id: int) -> Optional[List[tuple]]:
-    conn = create_connection(DB_PATH)
-    if not conn:
-        context.bot.send_message(chat_id, DB_ERROR)
-        return
+# a page of the user's books after cursor, sorted by rowid (the sort key is the rowid itself)
+def get_user_books(context: CallbackContext, chat_id: int, cursor: Optional[str] = None) -> Optional[List[tuple]]:
+    user = get_username(context, chat_id)
+    after = decode_cursor(cursor)
+    query = "SELECT rowid, ISBN, Title, Authors, Seller, Price, rowid FROM Market WHERE Seller=? AND rowid>? ORDER BY rowid LIMIT ?"
+    params = (user, after[1] if after else 0, PAGE_SIZE + 1)
+    return connect_and_execute(context, chat_id, query, params, SELECT, "user_books")
+
 
-    user = "@" + str(context.bot.get_chat(chat_id)["username"])
-    query = "SELECT rowid, * FROM Market WHERE Seller=?"
-    rows = connect_and_execute(context, chat_id, query, (user,), SELECT)
+# shows a page of the user's books, for /libri or, with the buttons to delete them, for /elimina
+# pylint: disable=too-many-arguments
+def show_user_books(context: CallbackContext, chat_id: int, kind: str, shown: int = 0, cursor: Optional[str] = None, callback_query: CallbackQuery = None) -> None:
+    rows = get_user_books(context, chat_id, cursor)
+    if not rows:
+        if callback_query is not None:
+            callback_query.edit_message_text(text = NO_BOOKS)
+        else:
+            queue_message(context, chat_id, NO_BOOKS)
+        return
 
-    if rows:
-        context.bot.send_message(chat_id, LIST_BOOKS)
-        send_results(rows, chat_id, context)
-    else:
-        context.bot.send_message(chat_id, NO_BOOKS)
-    return rows
+    header = LIST_BOOKS if kind == BOOKS_PAGE else SELECT_BOOK_TO_DELETE + "\n"
+    send_results(context, chat_id, header, rows, (kind, "", shown), callback_query)
 
 
 def my_books(update: Update, context: CallbackContext) -> None:
     chat_id = update.effective_chat.id
     message = update.message.text
     if message != "/libri":
-        context.bot.send_message(chat_id, MY_BOOKS_USAGE)
+        queue_message(context, chat_id, MY_BOOKS_USAGE)
         return
-    get_user_books(context, chat_id)
+    show_user_books(context, chat_id, BOOKS_PAGE)
@@ -0,0 +1,94 @@
+import time
+from typing import List, Optional
+from telegram import CallbackQuery, Update
+from telegram.ext import CallbackContext
+from module.config import get_config
+from module.create_connection import connect_and_execute, transaction
+from module.manage_requests import get_group_id, accept_request, decline_request
+from module.send_results import send_results, decode_cursor
+from module.shared import PAGE_SIZE, PENDING_PAGE, PENDING_PAGES, PENDING_LIST, PENDING_DIGEST, NO_PENDING, PENDING_EXPIRED, STORED_SEARCHES, ALL, YES, NO, SELECT
+from module.message_queue import queue_message
+
+
+# the pages of pending requests shown in the admin group, as (shown, cursor, rowids of the requests):
+# "approve all" approves the requests the admin saw, and each button shows the page again once done.
+# They are kept in the group's chat_data, that the digest job reaches through the dispatcher
+def _pages(context: CallbackContext, chat_id: int) -> dict:
+    return context.dispatcher.chat_data[chat_id].setdefault(PENDING_PAGES, {})
+
+
+def _store_page(context: CallbackContext, chat_id: int, page: tuple) -> int:
+    pages = _pages(context, chat_id)
+    page_id = max(pages, default = 0) + 1
+    pages[page_id] = page
+    for old_id in sorted(pages)[:-STORED_SEARCHES]:
+        del pages[old_id]
+    return page_id
+
+
+# a page of the pending requests after cursor, the oldest first (the sort key is the rowid itself)
+def get_pending(context: CallbackContext, chat_id: int, cursor: Optional[str] = None) -> Optional[List[tuple]]:
+    after = decode_cursor(cursor)
+    query = "SELECT rowid, ISBN, Title, Authors, Seller, Price, rowid FROM Requests WHERE rowid>? ORDER BY rowid LIMIT ?"
+    return connect_and_execute(context, chat_id, query, (after[1] if after else 0, PAGE_SIZE + 1), SELECT, "pending_page")
+
+
+# pylint: disable=too-many-arguments
+def show_pending(context: CallbackContext, chat_id: int, shown: int = 0, cursor: Optional[str] = None, callback_query: CallbackQuery = None, header: str = PENDING_LIST) -> None:
+    rows = get_pending(context, chat_id, cursor)
+    if not rows:
+        if callback_query is not None:
+            callback_query.edit_message_text(text = NO_PENDING)
+        else:
+            queue_message(context, chat_id, NO_PENDING)
+        return
+
+    page_id = _store_page(context, chat_id, (shown, cursor, [row[0] for row in rows[:PAGE_SIZE]]))
+    send_results(context, chat_id, header, rows, (PENDING_PAGE, page_id, shown), callback_query)
+
+
+# the ✅/❌ buttons of a request and "approve all", with data "pending;<Y|N|all>;<page id>;<rowid>"
+def pending_action(context: CallbackContext, chat_id: int, callback_query: CallbackQuery) -> None:
+    _, action, page_id, row_id = callback_query.data.split(';')
+    page = _pages(context, chat_id).get(int(page_id))
+    if page is None:
+        callback_query.edit_message_text(text = PENDING_EXPIRED)
+        return
+
+    shown, cursor, row_ids = page
+    callback_query.answer()
+    if action == ALL:
+        for request_id in row_ids:
+            accept_request(context, request_id)
+    elif action == YES:
+        accept_request(context, int(row_id))
+    elif action == NO:
+        decline_request(context, int(row_id))
+    # the requests that are left take the place of the ones done
+    show_pending(context, chat_id, shown, cursor, callback_query)
+
+
+# /pending, in the admin group: the pending requests, a page at a time
+def pending(update: Update, context: CallbackContext) -> None:
+    chat_id = update.effective_chat.id
+    if chat_id != get_group_id():
+        return
+    show_pending(context, chat_id)
+
+
+# in digest mode (digest_minutes), the new requests are sent to the admins in a single message
+# once the oldest of them has waited digest_minutes. When digest mode is turned off, the requests
+# still waiting for a digest are sent right away
+def send_digest(context: CallbackContext) -> None:
+    wait = get_config().digest_minutes * 60
+    group_id = get_group_id()
+    now = time.time()
+    with transaction() as conn:
+        count, oldest, first_id = conn.execute("SELECT COUNT(*), MIN(RequestedAt), MIN(rowid) FROM Requests WHERE NotifiedAt IS NULL").fetchone()
+        if not count or (oldest or 0) > now - wait:
+            return
+        conn.execute("UPDATE Requests SET NotifiedAt=? WHERE NotifiedAt IS NULL", (now,))
+        # the older requests, already sent, come before the new ones
+        shown = conn.execute("SELECT COUNT(*) FROM Requests WHERE rowid<?", (first_id,)).fetchone()[0]
+    # the digest opens at the first new request (the sort key of the pending requests is their rowid)
+    show_pending(context, group_id, shown, f"{first_id - 1}:{first_id - 1}", header = PENDING_DIGEST.format(count))
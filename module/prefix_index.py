@@ -0,0 +1,133 @@
+import re
+import sqlite3
+import threading
+from bisect import bisect_left, insort
+from functools import lru_cache
+from typing import List, Optional
+from module.text_fold import fold
+from module.shared import SUGGEST_LIMIT, SUGGEST_SCAN, MARKET_LOG_KEEP, SUGGEST_CACHE_SIZE
+
+TITLE = "title"
+AUTHOR = "author"
+ISBN = "isbn"
+
+
+# lowercase and without accents, so that "perche" completes "Perché"
+def normalize(text: str) -> str:
+    return " ".join(fold(text).split())
+
+
+def _from_each_word(entries: set, text: str, kind: str) -> None:
+    key = normalize(text)
+    for word in re.finditer(r"\w+", key):
+        entries.add((key[word.start():], text, kind))
+
+
+# the (key, text, kind) completions of a book on sale: its title and each of its authors, also
+# from any of their words (so that "matem" completes "Analisi matematica"), and its ISBN.
+# The same book is usually on sale more than once, hence the cache
+@lru_cache(maxsize = SUGGEST_CACHE_SIZE)
+def _entries(title: Optional[str], authors: Optional[str], isbn: Optional[str]) -> frozenset:
+    entries = set()
+    if title and title.strip():
+        _from_each_word(entries, " ".join(title.split()), TITLE)
+    for author in (authors or "").split(","):
+        if author.strip():
+            _from_each_word(entries, " ".join(author.split()), AUTHOR)
+    if isbn and isbn.strip():
+        entries.add((isbn.strip(), isbn.strip(), ISBN))
+    return frozenset(entries)
+
+
+# completions of the titles, authors and ISBNs on sale, in a sorted array searched with bisect.
+# It is built from Market once and then kept up to date by applying the changes in MarketLog
+class PrefixIndex:
+    def __init__(self) -> None:
+        self._keys = []
+        # (key, text, kind) -> number of books on sale with that completion
+        self._counts = {}
+        self._last_log_id = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def is_built(self) -> bool:
+        return self._last_log_id is not None
+
+    def _add(self, entry: tuple, count: int = 1) -> None:
+        old = self._counts.get(entry, 0)
+        self._counts[entry] = old + count
+        if not old:
+            insort(self._keys, entry)
+
+    def _remove(self, entry: tuple) -> None:
+        count = self._counts.get(entry, 0) - 1
+        if count > 0:
+            self._counts[entry] = count
+        elif count == 0:
+            del self._counts[entry]
+            del self._keys[bisect_left(self._keys, entry)]
+
+    def build(self, conn: sqlite3.Connection) -> None:
+        counts = {}
+        # a single read transaction, so that the log position matches the rows read
+        conn.execute("BEGIN")
+        try:
+            last_log_id = conn.execute("SELECT COALESCE(MAX(Id), 0) FROM MarketLog").fetchone()[0]
+            books = conn.execute("SELECT Title, Authors, ISBN, COUNT(*) FROM Market GROUP BY Title, Authors, ISBN")
+            for title, authors, isbn, copies in books:
+                for entry in _entries(title, authors, isbn):
+                    counts[entry] = counts.get(entry, 0) + copies
+        finally:
+            conn.execute("COMMIT")
+        with self._lock:
+            self._counts = counts
+            self._keys = sorted(counts)
+            self._last_log_id = last_log_id
+
+    # applies the changes made to Market after the last refresh, if the database changed since then
+    def refresh(self, conn: sqlite3.Connection, version: Optional[int] = None) -> None:
+        if not self.is_built():
+            self.build(conn)
+        if version is not None and version == self._version:
+            return
+        first_log_id = conn.execute("SELECT MIN(Id) FROM MarketLog").fetchone()[0]
+        if first_log_id is not None and first_log_id > self._last_log_id + 1:
+            # the changes this index missed are not in the log anymore
+            self.build(conn)
+        with self._lock:
+            changes = conn.execute("SELECT Id, Op, Title, Authors, ISBN FROM MarketLog WHERE Id > ? ORDER BY Id", (self._last_log_id,)).fetchall()
+            for log_id, op, title, authors, isbn in changes:
+                for entry in _entries(title, authors, isbn):
+                    if op == "+":
+                        self._add(entry)
+                    else:
+                        self._remove(entry)
+                self._last_log_id = log_id
+            self._version = version
+        if first_log_id is not None and self._last_log_id - first_log_id > 2 * MARKET_LOG_KEEP:
+            conn.execute("DELETE FROM MarketLog WHERE Id <= ?", (self._last_log_id - MARKET_LOG_KEEP,))
+
+    # the completions of prefix, the ones of more books on sale first
+    def suggest(self, prefix: str, limit: int = SUGGEST_LIMIT) -> List[dict]:
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        matches = []
+        with self._lock:
+            start = bisect_left(self._keys, (prefix,))
+            for entry in self._keys[start:start + SUGGEST_SCAN]:
+                if not entry[0].startswith(prefix):
+                    break
+                matches.append((-self._counts[entry], entry[1], entry[2]))
+        suggestions = []
+        seen = set()
+        for _, text, kind in sorted(matches):
+            if (text, kind) not in seen:
+                seen.add((text, kind))
+                suggestions.append({"text": text, "kind": kind})
+                if len(suggestions) == limit:
+                    break
+        return suggestions
+
+
+market_index = PrefixIndex()
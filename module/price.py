@@ -0,0 +1,16 @@
+from typing import Optional
+
+# prices are stored as the users wrote them (Market.Price, e.g. "12,50") and as integer cents
+# (Market.PriceCents), that can be compared and sorted by an index. A price that isn't a number
+# has no cents (NULL). The queries and triggers call price_cents itself, registered as an SQL
+# function on every connection, so that they always agree with it
+PRICE_CENTS_SQL = "price_cents({})"
+
+
+# the cents must fit an SQLite INTEGER (signed 64 bit)
+def price_cents(price: str) -> Optional[int]:
+    try:
+        cents = round(float(str(price).strip().replace(",", ".")) * 100)
+    except (ValueError, OverflowError):
+        return None
+    return cents if -2 ** 63 <= cents < 2 ** 63 else None
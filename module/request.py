@@ -1,80 +1,127 @@
-import bs4
+from concurrent.futures import Future
+from functools import partial
+import logging
+import sqlite3
+from typing import Optional
 from telegram import Update
 from telegram.ext import CallbackContext
 from module.add_item import add_item
 from module.add_book import add_book
 from module.find import find
-from module.book_in_unict import book_in_unict
-from module.create_connection import connect_and_execute
+from module.isbn import canonical_isbn
+from module.book_in_unict import lookup_book
+from module.catalog_client import CatalogUnavailable
+from module.create_connection import connect_and_execute, transaction
 from module.manage_requests import add_request, send_request
 from module.send_results import get_book_info
-from module.shared import PRICE_ERROR,USERNAME_ERROR,ISBN_ERROR,REQUEST_USAGE,REQUEST_SENT,REQUEST_ALREADY_SENT,BOOK_IS_PRESENT,ON_SALE_CONFIRM,BOOKS,SELECT
+from module.shared import DB_ERROR,PRICE_ERROR,USERNAME_ERROR,ISBN_ERROR,REQUEST_USAGE,REQUEST_SENT,REQUEST_ALREADY_SENT,BOOK_IS_PRESENT,ON_SALE_CONFIRM,BOOKS,SELECT,CATALOG_ERROR,CATALOG_UNAVAILABLE
+from module.message_queue import queue_message
+from module.price import price_cents
+from module.watchlist import notify_watchers
+from module.usernames import get_username
 
+logger = logging.getLogger(__name__)
 
-def _get_isbn_from_website(soup: bs4.BeautifulSoup) -> str:
-    idx = len(str(soup.findAll("td")).split("bibInfoData")) - 1
-    return str(soup.findAll("td")) \
-        .split("bibInfoData")[idx] \
-        .split("\n")[1] \
-        .split("<")[0]
+
+# pylint: disable=too-many-arguments
+def _request_from_catalog(context: CallbackContext, chat_id: int, user_book: tuple, username: str, price: str, future: Future) -> None:
+    try:
+        found, book = future.result()
+    except CatalogUnavailable:
+        queue_message(context, chat_id, CATALOG_UNAVAILABLE)
+        return
+    # pylint: disable=broad-except
+    except Exception:
+        logger.exception("Catalog lookup failed")
+        queue_message(context, chat_id, CATALOG_ERROR)
+        return
+
+    # the callback runs in the catalog's thread: an error raised here would reach nobody
+    try:
+        _request_book(context, chat_id, book if found else None, user_book, username, price)
+    except sqlite3.Error:
+        logger.exception("Could not request %s", user_book[0])
+        queue_message(context, chat_id, DB_ERROR)
+
+
+# the book is put on sale if the catalog knows it, otherwise it is sent to the admins to be approved
+# pylint: disable=too-many-arguments
+def _request_book(context: CallbackContext, chat_id: int, book: Optional[tuple], user_book: tuple, username: str, price: str) -> None:
+    if book is not None:
+        isbn, title, authors = book
+        queue_message(context, chat_id, BOOK_IS_PRESENT + get_book_info(isbn, title, authors))
+        with transaction():
+            if not find(context, chat_id, isbn, BOOKS):
+                add_book(context, chat_id, isbn, title, authors)
+            listing = add_item(context, chat_id, isbn, title, authors, username, price)
+        queue_message(context, chat_id, ON_SALE_CONFIRM)
+        if listing:
+            notify_watchers(context, [listing])
+        return
+
+    user_isbn, title, authors = user_book
+    query = "SELECT * FROM Requests WHERE ISBN=? AND Seller=?"
+    params = (user_isbn, username,)
+
+    rows = connect_and_execute(context, chat_id, query, params, SELECT, "find_request")
+    message_text = REQUEST_ALREADY_SENT
+    if not rows:
+        try:
+            row_id = add_request(context, chat_id, user_isbn, title, authors, username, price)
+            send_request(context, row_id)
+            message_text = REQUEST_SENT
+        except sqlite3.IntegrityError:
+            # a concurrent /richiedi for the same (ISBN, Seller) got there first
+            pass
+
+    queue_message(context, chat_id, message_text)
 
 
 def request(update: Update, context: CallbackContext) -> None:
     chat_id = update.effective_chat.id
     message = update.message.text
     if message == "/richiedi" or len(message.split('; ')) != 4:
-        context.bot.send_message(chat_id, REQUEST_USAGE)
+        queue_message(context, chat_id, REQUEST_USAGE)
         return
 
-    username = "@" + str(context.bot.get_chat(chat_id)["username"])
-    if username.lower() == "@none":
-        context.bot.send_message(chat_id, USERNAME_ERROR)
+    username = get_username(context, chat_id)
+    if username is None:
+        queue_message(context, chat_id, USERNAME_ERROR)
         return
 
-    user_isbn = message.split('; ')[0].split()[1]
-    if len(user_isbn) != 10 and len(user_isbn) != 13:
-        context.bot.send_message(chat_id, ISBN_ERROR)
+    # the books are looked up by their ISBN-13, whichever form the user typed
+    user_isbn = canonical_isbn(message.split('; ')[0].split()[1])
+    if user_isbn is None:
+        queue_message(context, chat_id, ISBN_ERROR)
         return
 
     try:
         format(float(message.split('; ')[1].replace(",", ".")), ".2f")
         price = str(format(float(message.split('; ')[1].replace(",", ".")), ".2f"))
+        # e.g. "1e20" or "nan", that can't be stored in cents
+        if price_cents(price) is None:
+            queue_message(context, chat_id, PRICE_ERROR)
+            return
 
         rows = find(context, chat_id, user_isbn, BOOKS)
 
         if rows:
             isbn, title, authors = rows[0]
-            context.bot.send_message(chat_id, BOOK_IS_PRESENT + get_book_info(isbn, title, authors))
-            add_item(context, chat_id, isbn, title, authors, username, price)
-            context.bot.send_message(chat_id, ON_SALE_CONFIRM)
-            return
-
-        found, soup = book_in_unict(user_isbn)
-        if found:
-            isbn = _get_isbn_from_website(soup)
-            title, authors = soup.find("strong").text.split("/")
-            context.bot.send_message(chat_id, BOOK_IS_PRESENT + get_book_info(isbn, title, authors))
-            add_book(context, chat_id, isbn, title, authors)
-            add_item(context, chat_id, isbn, title, authors, username, price)
-            context.bot.send_message(chat_id, ON_SALE_CONFIRM)
+            queue_message(context, chat_id, BOOK_IS_PRESENT + get_book_info(isbn, title, authors))
+            listing = add_item(context, chat_id, isbn, title, authors, username, price)
+            queue_message(context, chat_id, ON_SALE_CONFIRM)
+            if listing:
+                notify_watchers(context, [listing])
             return
 
         _, _, title, authors = message.split('; ')
+        # the reply is sent by _request_from_catalog once the catalog answers
+        lookup_book(user_isbn).add_done_callback(partial(_request_from_catalog, context, chat_id, (user_isbn, title, authors), username, price))
 
-        query = "SELECT * FROM Requests WHERE ISBN=? AND Seller=?"
-        params = (user_isbn, username,)
-
-        rows = connect_and_execute(context, chat_id, query, params, SELECT)
-        if not rows:
-            row_id = add_request(context, chat_id, user_isbn, title, authors, username, price)
-            send_request(context, row_id)
-            message_text = REQUEST_SENT
-        else:
-            message_text = REQUEST_ALREADY_SENT
-
-        context.bot.send_message(chat_id, message_text)
-
+    except sqlite3.Error:
+        logger.exception("Could not request %s", user_isbn)
+        queue_message(context, chat_id, DB_ERROR)
     # pylint: disable=broad-except
     except Exception as e:
-        print(str(e))
-        context.bot.send_message(chat_id, PRICE_ERROR)
+        logger.info("Invalid /richiedi from %s: %s", chat_id, e)
+        queue_message(context, chat_id, PRICE_ERROR)
@@ -0,0 +1,37 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+# bounded LRU cache of query results. Every entry remembers the database version it was
+# computed at (see create_connection.data_version) and, optionally, expires after ttl seconds
+class ResultCache:
+    def __init__(self, size: int, ttl: Optional[float] = None) -> None:
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: Any = None) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, entry_version, stored_at = entry
+            if entry_version != version or (self.ttl is not None and time.monotonic() - stored_at > self.ttl):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any, version: Any = None) -> None:
+        with self._lock:
+            self._entries[key] = (value, version, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last = False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -1,22 +1,47 @@
-from telegram import Update
+from typing import Optional
+from telegram import CallbackQuery, Update
 from telegram.ext import CallbackContext
-from module.find import find
+from module.find import find, parse_search
 from module.send_results import send_results
-from module.shared import SEARCH_USAGE, MARKET, NOTHING_FOUND, SEARCH_RESULT
+from module.shared import SEARCH_USAGE, MARKET, NOTHING_FOUND, SEARCH_RESULT, SEARCH_PAGE, SEARCHES, STORED_SEARCHES, SEARCH_EXPIRED
+from module.message_queue import queue_message
+
+
+# the text of the last searches of the chat is kept in chat_data, so that
+# the "next page" buttons only need to carry its id
+def _store_search(context: CallbackContext, txt: str) -> int:
+    searches = context.chat_data.setdefault(SEARCHES, {})
+    search_id = max(searches, default = 0) + 1
+    searches[search_id] = txt
+    for old_id in sorted(searches)[:-STORED_SEARCHES]:
+        del searches[old_id]
+    return search_id
+
+
+# pylint: disable=too-many-arguments
+def show_search(context: CallbackContext, chat_id: int, search_id: int, shown: int = 0, cursor: Optional[str] = None, callback_query: CallbackQuery = None) -> None:
+    txt = context.chat_data.get(SEARCHES, {}).get(search_id)
+    if txt is None:
+        callback_query.edit_message_text(text = SEARCH_EXPIRED)
+        return
+
+    # the options are parsed again for each page, as only the text is stored
+    txt, options = parse_search(txt)
+    rows = find(context, chat_id, txt, MARKET, cursor, options = options)
+    if rows:
+        send_results(context, chat_id, SEARCH_RESULT, rows, (SEARCH_PAGE, search_id, shown), callback_query)
+    elif callback_query is not None:
+        callback_query.edit_message_text(text = NOTHING_FOUND)
+    else:
+        queue_message(context, chat_id, NOTHING_FOUND)
 
 
 def search(update: Update, context: CallbackContext) -> None:
     chat_id = update.effective_chat.id
     message = update.message.text
     if message == "/cerca":
-        context.bot.send_message(chat_id, SEARCH_USAGE)
+        queue_message(context, chat_id, SEARCH_USAGE)
         return
 
     _, message = message.split("/cerca ")
-    rows = find(context, chat_id, message, MARKET)
-
-    if rows:
-        context.bot.send_message(chat_id, SEARCH_RESULT)
-        send_results(rows, chat_id, context)
-    else:
-        context.bot.send_message(chat_id, NOTHING_FOUND)
+    show_search(context, chat_id, _store_search(context, message))
@@ -1,80 +1,104 @@
-import bs4
-import re
+import logging
+import sqlite3
+from concurrent.futures import Future
+from functools import partial
 from telegram import Update
 from telegram.ext import CallbackContext
 from module.add_item import add_item
 from module.add_book import add_book
 from module.find import find
-from module.book_in_unict import book_in_unict
+from module.isbn import canonical_isbn
+from module.book_in_unict import lookup_book
+from module.catalog_client import CatalogUnavailable
+from module.create_connection import transaction
 from module.send_results import get_book_info
-from module.shared import PRICE_ERROR,USERNAME_ERROR,ISBN_ERROR,SELL_USAGE,ISBN_PREFIX_1,ISBN_PREFIX_2,ON_SALE_CONFIRM,BOOKS,SEARCHING_ISBN,BOOK_NOT_AVAILABLE
+from module.shared import DB_ERROR,PRICE_ERROR,USERNAME_ERROR,ISBN_ERROR,SELL_USAGE,ON_SALE_CONFIRM,BOOKS,SEARCHING_ISBN,BOOK_NOT_AVAILABLE,CATALOG_ERROR,CATALOG_UNAVAILABLE
+from module.message_queue import queue_message
+from module.price import price_cents
+from module.watchlist import notify_watchers
+from module.usernames import get_username
 
+logger = logging.getLogger(__name__)
 
-def _get_isbn_from_website(soup: bs4.BeautifulSoup) -> str:
-    idx = len(str(soup.findAll("td")).split("bibInfoData")) - 1
-    isbn = str(soup.findAll("td")) \
-        .split("bibInfoData")[idx] \
-        .split("\n")[1] \
-        .split("<")[0]
-    isbn = isbn.replace('-','')
-    if len(isbn) > 13:
-        p1 = re.search(ISBN_PREFIX_1, isbn)
-        if p1 is not None:
-            s = p1.span()[0]
-            return isbn[s:s+13]
 
-        p2 = re.search(ISBN_PREFIX_2, isbn)
-        if p2 is not None:
-            s = p2.span()[0]
-            return isbn[s:s+13]
-    return isbn
+def _sell_from_catalog(context: CallbackContext, chat_id: int, username: str, price: str, future: Future) -> None:
+    try:
+        found, book = future.result()
+    except CatalogUnavailable:
+        queue_message(context, chat_id, CATALOG_UNAVAILABLE)
+        return
+    # pylint: disable=broad-except
+    except Exception:
+        logger.exception("Catalog lookup failed")
+        queue_message(context, chat_id, CATALOG_ERROR)
+        return
+
+    if not found:
+        queue_message(context, chat_id, BOOK_NOT_AVAILABLE)
+        return
+
+    isbn, title, authors = book
+    queue_message(context, chat_id, get_book_info(isbn, title, authors))
+    # the callback runs in the catalog's thread: an error raised here would reach nobody
+    try:
+        with transaction():
+            if not find(context, chat_id, isbn, BOOKS):
+                add_book(context, chat_id, isbn, title, authors)
+            listing = add_item(context, chat_id, isbn, title, authors, username, price)
+    except sqlite3.Error:
+        logger.exception("Could not put %s on sale", isbn)
+        queue_message(context, chat_id, DB_ERROR)
+        return
+    queue_message(context, chat_id, ON_SALE_CONFIRM)
+    if listing:
+        notify_watchers(context, [listing])
 
 
 def sell(update: Update, context: CallbackContext) -> None:
     chat_id = update.effective_chat.id
     message = update.message.text
     if message == "/vendi":
-        context.bot.send_message(chat_id, SELL_USAGE)
+        queue_message(context, chat_id, SELL_USAGE)
         return
 
-    username = "@" + str(context.bot.get_chat(chat_id)["username"])
-    if username.lower() == "@none":
-        context.bot.send_message(chat_id, USERNAME_ERROR)
+    username = get_username(context, chat_id)
+    if username is None:
+        queue_message(context, chat_id, USERNAME_ERROR)
         return
 
-    user_isbn = message.split()[1]
-    if len(user_isbn) != 10 and len(user_isbn) != 13:
-        context.bot.send_message(chat_id, ISBN_ERROR)
+    # the books are looked up by their ISBN-13, whichever form the user typed
+    user_isbn = canonical_isbn(message.split()[1])
+    if user_isbn is None:
+        queue_message(context, chat_id, ISBN_ERROR)
         return
 
     try:
         format(float(message.split()[2].replace(",", ".")), ".2f")
         price = str(format(float(message.split()[2].replace(",", ".")), ".2f"))
-        context.bot.send_message(chat_id, SEARCHING_ISBN)
+        # e.g. "1e20" or "nan", that can't be stored in cents
+        if price_cents(price) is None:
+            queue_message(context, chat_id, PRICE_ERROR)
+            return
+        queue_message(context, chat_id, SEARCHING_ISBN)
 
         rows = find(context, chat_id, user_isbn, BOOKS)
 
         if rows:
             isbn, title, authors = rows[0]
-            context.bot.send_message(chat_id, get_book_info(isbn, title, authors))
-            add_item(context, chat_id, isbn, title, authors, username, price)
-            context.bot.send_message(chat_id, ON_SALE_CONFIRM)
-            return
-
-        found, soup = book_in_unict(user_isbn)
-        if found:
-            isbn = _get_isbn_from_website(soup)
-            title, authors = soup.find("strong").text.split("/")
-            context.bot.send_message(chat_id, get_book_info(isbn, title, authors))
-            if not find(context, chat_id, isbn, BOOKS):
-                add_book(context, chat_id, isbn, title, authors)
-            add_item(context, chat_id, isbn, title, authors, username, price)
-            context.bot.send_message(chat_id, ON_SALE_CONFIRM)
+            queue_message(context, chat_id, get_book_info(isbn, title, authors))
+            listing = add_item(context, chat_id, isbn, title, authors, username, price)
+            queue_message(context, chat_id, ON_SALE_CONFIRM)
+            if listing:
+                notify_watchers(context, [listing])
             return
 
-        context.bot.send_message(chat_id, BOOK_NOT_AVAILABLE)
+        # the reply is sent by _sell_from_catalog once the catalog answers
+        lookup_book(user_isbn).add_done_callback(partial(_sell_from_catalog, context, chat_id, username, price))
 
+    except sqlite3.Error:
+        logger.exception("Could not put %s on sale", user_isbn)
+        queue_message(context, chat_id, DB_ERROR)
     # pylint: disable=broad-except
     except Exception as e:
-        print(str(e))
-        context.bot.send_message(chat_id, PRICE_ERROR)
+        logger.info("Invalid /vendi from %s: %s", chat_id, e)
+        queue_message(context, chat_id, PRICE_ERROR)
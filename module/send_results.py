@@ -1,17 +1,87 @@
-from typing import List
+import math
+from typing import List, Optional
+from telegram import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
+from module.shared import PAGE, PAGE_SIZE, DELETE_PAGE, DELETE_APPROVED, NEXT_PAGE, FIRST_PAGE, PENDING, PENDING_PAGE, APPROVE_ALL, ALL, YES, NO
+from module.message_queue import queue_message
 
 
-def send_results(rows: List, chat_id: int, context: CallbackContext) -> None:
+# paged queries select the sort key as last column, after the rowid and the Market fields.
+# The cursor of a page is the sort key and rowid of its last row
+def encode_cursor(row: tuple) -> str:
+    return f"{row[-1]!r}:{row[0]}"
+
+
+# raises ValueError if the cursor wasn't made by encode_cursor
+def decode_cursor(cursor: str) -> Optional[tuple]:
+    if not cursor:
+        return None
+    key, _, row_id = cursor.rpartition(":")
+    after = (float(key), int(row_id))
+    # the row id is bound as an SQLite INTEGER (signed 64 bit)
+    if not math.isfinite(after[0]) or not 0 <= after[1] < 2 ** 63:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return after
+
+
+# cursors come back from the clients (the API, the inline queries' offset, the buttons' data)
+def is_valid_cursor(cursor: Optional[str]) -> bool:
+    try:
+        decode_cursor(cursor)
+        return True
+    except ValueError:
+        return False
+
+
+# paged queries fetch one row more than a page, to know whether there is a next one
+def split_page(rows: List, limit: int = PAGE_SIZE) -> tuple:
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+def format_results(rows: List, shown: int = 0) -> str:
     res = ""
-    # pylint: disable=consider-using-enumerate
-    for i in range(len(rows)):
-        res += ("n°: " + str(i + 1) + "\n" + get_item_info(rows[i][1], rows[i][2], rows[i][3], rows[i][4], rows[i][5]) + "\n")
-        if (i + 1) % 3 == 0:
-            context.bot.send_message(chat_id, res)
-            res = ""
-    if res != "":
-        context.bot.send_message(chat_id, res)
+    for i, row in enumerate(rows, start = shown + 1):
+        res += ("n°: " + str(i) + "\n" + get_item_info(row[1], row[2], row[3], row[4], row[5]) + "\n")
+    return res
+
+
+def _results_keyboard(rows: List, page: tuple, next_cursor: Optional[str]) -> Optional[InlineKeyboardMarkup]:
+    kind, arg, shown = page
+    keyboard = []
+    if kind == DELETE_PAGE:
+        keyboard.append([InlineKeyboardButton(str(i), callback_data = DELETE_APPROVED + str(row[0])) for i, row in enumerate(rows, start = shown + 1)])
+    if kind == PENDING_PAGE:
+        # arg is the id of the page, that remembers which requests "approve all" is about
+        for i, row in enumerate(rows, start = shown + 1):
+            keyboard.append([InlineKeyboardButton(f"✅ {i}", callback_data = f"{PENDING};{YES};{arg};{row[0]}"),
+                             InlineKeyboardButton(f"❌ {i}", callback_data = f"{PENDING};{NO};{arg};{row[0]}")])
+        keyboard.append([InlineKeyboardButton(APPROVE_ALL, callback_data = f"{PENDING};{ALL};{arg};")])
+
+    navigation = []
+    if shown:
+        navigation.append(InlineKeyboardButton(FIRST_PAGE, callback_data = f"{PAGE};{kind};{arg};0;"))
+    if next_cursor:
+        navigation.append(InlineKeyboardButton(NEXT_PAGE, callback_data = f"{PAGE};{kind};{arg};{shown + len(rows)};{next_cursor}"))
+    if navigation:
+        keyboard.append(navigation)
+    return InlineKeyboardMarkup(keyboard) if keyboard else None
+
+
+# sends a page of results as a single message, with the buttons to move to the next page.
+# page is (kind, arg, shown): the kind of listing, its argument (e.g. the search id) and how
+# many results the previous pages showed. When moving between pages the message is edited in place
+# pylint: disable=too-many-arguments
+def send_results(context: CallbackContext, chat_id: int, header: str, rows: List, page: tuple, callback_query: CallbackQuery = None) -> None:
+    rows, next_cursor = split_page(rows)
+    text = header + format_results(rows, page[2])
+    reply_markup = _results_keyboard(rows, page, next_cursor)
+    if callback_query is not None:
+        callback_query.edit_message_text(text = text, reply_markup = reply_markup)
+    else:
+        queue_message(context, chat_id, text, reply_markup = reply_markup)
 
 
 def get_book_info(isbn: str, title: str, authors: str) -> str:
@@ -20,4 +90,3 @@ def get_book_info(isbn: str, title: str, authors: str) -> str:
 
 def get_item_info(isbn: str, title: str, authors: str, seller: str, price: str) -> str:
     return f"ISBN: {isbn} \nTitolo: {title}\nAutori: {authors}\nVenditore: {seller}\nPrezzo: {price} €\n"
-    
\ No newline at end of file
@@ -3,15 +3,79 @@ DB_PATH = "data/bookmarket.db"
 
 YAML_PATH = "config/settings.yaml"
 
+CONFIG_CHECK_INTERVAL = 1.0
+
+
+# Database
+POOL_SIZE = 8
+
+STATEMENT_CACHE_SIZE = 256
+
+BUSY_TIMEOUT = 5.0
+
+
+# Outgoing messages: (messages per second, burst)
+GLOBAL_RATE = (30.0, 30.0)
+
+CHAT_RATE = (1.0, 2.0)
+
+GROUP_RATE = (20 / 60, 3.0)
+
+MESSAGE_MAX_LENGTH = 4096
+
+SEND_RETRIES = 3
+
+
+# Updates
+TELEGRAM_API_URL = "https://api.telegram.org/bot"
+
+WEBHOOK_PATH = "/telegram/"
+
+WORKERS = 4
+
+PORT = 5000
+
+
+# Metrics: upper bounds, in seconds, of the latency histograms' buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# Usernames
+USERNAME_CACHE_SIZE = 4096
+
+USERNAME_TTL = 60 * 60
+
+
+# Listings: unless the seller confirms them, they are deleted listing_ttl_days
+# after being put on sale, and the seller is asked reminder_days before that
+DAY = 24 * 60 * 60
+
+LISTING_TTL_DAYS = 90
+
+REMINDER_DAYS = 7
+
+# how often expired listings are looked for, and the database is maintained
+EXPIRY_INTERVAL = 60 * 60
+
+MAINTENANCE_INTERVAL = DAY
+
+# rows deleted (or reminded) in each transaction, so that the bot can write in between
+EXPIRY_BATCH = 500
+
+# pages of the full-text indexes merged at each maintenance
+FTS_MERGE_PAGES = 500
+
 
 # Error messages
 DB_ERROR = "Si è verificato un problema nella lettura del database."
 
 PRICE_ERROR = "Prezzo non valido."
 
+CURSOR_ERROR = "Cursore non valido."
+
 USERNAME_ERROR = "Per poter vendere libri devi avere un username pubblico, in modo tale che gli altri utenti possano contattarti. Puoi comunque acquistare libri con il comando /cerca."
 
-ISBN_ERROR = "ISBN non valido. Deve essere un numero di 10 o di 13 cifre."
+ISBN_ERROR = "ISBN non valido. Deve essere un ISBN-10 o un ISBN-13 (anche con i trattini): controlla di averlo scritto correttamente."
 
 
 # Command usage
@@ -21,10 +85,12 @@ DELETE_USAGE = "Utilizzo comando: /elimina"
 
 MY_BOOKS_USAGE = "Utilizzo comando: /libri"
 
-SEARCH_USAGE = "Utilizzo comando: /cerca <txt>"
+SEARCH_USAGE = "Utilizzo comando: /cerca <txt> [max:<Prezzo>] [ordina:prezzo]\n\nEs: /cerca analisi max:15 ordina:prezzo"
 
 SELL_USAGE = "Utilizzo comando: /vendi <ISBN> <Prezzo>"
 
+WATCH_USAGE = "Utilizzo comando: /avvisami <ISBN|parole chiave>\n\nEs: /avvisami analisi matematica"
+
 START_MESSAGE = "Ciao! Con questo bot puoi mettere in vendita i tuoi libri usati e comprare libri che altri colleghi non utilizzano più. Per maggiori informazioni utilizza il comando /help"
 
 
@@ -53,6 +119,27 @@ CASCADE_REQUEST = "Richiesta accettata a cascata precedentemente."
 
 BOOK_IS_PRESENT = "Il libro esiste già nel database locale. "
 
+PENDING = "pending"
+
+PENDING_PAGE = "richieste"
+
+PENDING_PAGES = "pending_pages"
+
+ALL = "all"
+
+APPROVE_ALL = "✅ Approva tutte"
+
+PENDING_LIST = "Richieste in attesa:\n"
+
+PENDING_DIGEST = "Nuove richieste in attesa: {}\n"
+
+NO_PENDING = "Non ci sono richieste in attesa."
+
+PENDING_EXPIRED = "Questa pagina è scaduta. Usa /pending per vedere le richieste in attesa."
+
+# how often the digest job looks for requests that have waited digest_minutes
+DIGEST_CHECK_INTERVAL = 60
+
 
 # Other constant
 NO = "N"
@@ -98,6 +185,107 @@ SEARCH_RESULT = "La ricerca ha prodotto i seguenti risultati:\n"
 
 NOTHING_FOUND = "Non ho trovato nulla."
 
+SEARCH_EXPIRED = "Questa ricerca è scaduta. Ripetila con il comando /cerca."
+
+
+# Expiry
+CONFIRM = "confirm"
+
+LISTING_REMINDER = "Hai ancora questo libro in vendita? Se non lo confermi, l'annuncio verrà eliminato tra {} giorni.\n\n"
+
+LISTING_CONFIRMED = "Annuncio confermato."
+
+LISTING_EXPIRED = "Il tuo annuncio è scaduto ed è stato eliminato. Se hai ancora il libro, rimettilo in vendita con /vendi.\n\n"
+
+STILL_ON_SALE = "✅ Ancora in vendita"
+
+SOLD = "🗑 Eliminalo"
+
+
+# Watchlists
+UNWATCH = "unwatch"
+
+WATCH_ADDED = "Fatto! Ti avviserò quando verrà messo in vendita un libro corrispondente."
+
+WATCH_EXISTS = "Stai già ricevendo gli avvisi per questa ricerca."
+
+WATCH_LIMIT_REACHED = "Hai raggiunto il numero massimo di avvisi. Eliminane qualcuno con il comando /avvisami."
+
+WATCH_LIST = "Ti avviserò quando verranno messi in vendita:\n"
+
+WATCH_REMOVED = "Avviso eliminato."
+
+WATCH_MATCH = "È stato messo in vendita un libro che stavi cercando:\n"
+
+WATCH_LIMIT = 20
+
+# keywords shorter than this are ignored, the longer ones only have to match their beginning
+WATCH_MIN_WORD = 2
+
+WATCH_MAX_WORD = 20
+
+
+# Pages
+PAGE = "page"
+
+PAGE_SIZE = 5
+
+SEARCH_PAGE = "cerca"
+
+BOOKS_PAGE = "libri"
+
+DELETE_PAGE = "elimina"
+
+NEXT_PAGE = "Avanti ▶"
+
+FIRST_PAGE = "⏮ Inizio"
+
+SEARCHES = "searches"
+
+API_PAGE_SIZE = 20
+
+API_MAX_PAGE_SIZE = 50
+
+MIN_QUERY_LENGTH = 3
+
+SEARCH_CACHE_SIZE = 512
+
+# Telegram shows at most 50 results for each answer to an inline query
+INLINE_PAGE_SIZE = 20
+
+INLINE_CACHE_SIZE = 1024
+
+INLINE_CACHE_TTL = 30
+
+SUGGEST_MIN_LENGTH = 2
+
+SUGGEST_LIMIT = 8
+
+SUGGEST_MAX_LIMIT = 20
+
+# completions looked at to find the most common ones, for short prefixes that match many
+SUGGEST_SCAN = 500
+
+SUGGEST_CACHE_SIZE = 8192
+
+# searches with no exact match look for similar titles and authors among this many candidates
+FUZZY_CANDIDATES = 200
+
+# the fraction of the search's trigrams a title and its authors must have to be shown
+FUZZY_THRESHOLD = 0.5
+
+# the sort keys of the similar results start from here, above the bm25 scores (never positive)
+FUZZY_KEY = 10.0
+
+# changes kept in MarketLog for the indexes that are behind
+MARKET_LOG_KEEP = 10000
+
+STORED_SEARCHES = 20
+
+CATALOG_ERROR = "Non è stato possibile contattare il catalogo di Ateneo. Riprova più tardi."
+
+CATALOG_UNAVAILABLE = "Il catalogo di Ateneo non è al momento disponibile. Riprova tra qualche minuto."
+
 BOOK_NOT_AVAILABLE = "Libro non trovato. Controlla di aver inserito correttamente l'ISBN. Se l'ISBN è corretto, utilizza il comando /richiedi per fare una richiesta di inserimento manuale."
 
 
@@ -107,3 +295,25 @@ URL_1 = "https://catalogo.unict.it/search/i?SEARCH="
 URL_2 = "&sortdropdown=-&searchscope=9"
 
 NO_MATCHES = "No matches found"
+
+# seconds to connect to the catalog, and to wait for its answer
+CATALOG_CONNECT_TIMEOUT = 3.05
+
+CATALOG_TIMEOUT = 10.0
+
+# requests that didn't reach the catalog are tried again this many times, after about
+# CATALOG_BACKOFF seconds and then twice as much each time
+CATALOG_RETRIES = 2
+
+CATALOG_BACKOFF = 0.5
+
+# after this many failed lookups in a row, the catalog isn't contacted for CATALOG_RESET seconds
+CATALOG_FAILURES = 5
+
+CATALOG_RESET = 60.0
+
+CATALOG_CACHE_SIZE = 1024
+
+CATALOG_WORKERS = 4
+
+NEGATIVE_CACHE_TTL = 6 * 60 * 60
@@ -1,7 +1,8 @@
 from telegram import Update
 from telegram.ext import CallbackContext
 from module.shared import START_MESSAGE
+from module.message_queue import queue_message
 
 def start(update: Update, context: CallbackContext) -> None:
     chat_id = update.effective_chat.id
-    context.bot.send_message(chat_id, START_MESSAGE)
+    queue_message(context, chat_id, START_MESSAGE)
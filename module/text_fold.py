@@ -0,0 +1,14 @@
+import unicodedata
+from typing import Optional
+
+
+# lowercase and without accents, for the searches that must ignore them: "perche" finds "Perché".
+# The letters are decomposed (NFKD) and their combining marks dropped, so every accented letter
+# is folded, whatever its language. The triggers that index Market call it as the SQL function fold()
+def fold(text: Optional[str]) -> Optional[str]:
+    if text is None:
+        return None
+    text = text.lower()
+    if text.isascii():
+        return text
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
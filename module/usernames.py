@@ -0,0 +1,71 @@
+import logging
+from typing import Optional
+from telegram import Update, User
+from telegram.ext import CallbackContext
+from module.create_connection import get_connection, transaction
+from module.result_cache import ResultCache
+from module.shared import USERNAME_CACHE_SIZE, USERNAME_TTL
+
+logger = logging.getLogger(__name__)
+
+# ("@username",) of the users that wrote to the bot, by chat id; (None,) if the user has no username
+_usernames = ResultCache(USERNAME_CACHE_SIZE, ttl = USERNAME_TTL)
+
+
+def _format(user: User) -> Optional[str]:
+    return "@" + user.username if user.username else None
+
+
+# whether some books or requests of the chat are under another username (through Market_ChatID and Requests_ChatID)
+STALE_SELLER = "SELECT EXISTS(SELECT 1 FROM Market WHERE ChatID=?1 AND Seller<>?2) OR EXISTS(SELECT 1 FROM Requests WHERE ChatID=?1 AND Seller<>?2)"
+
+
+# the books and the requests of the user follow them when they change their username. They are
+# found by the user's chat id; the books put on sale before the chat ids were stored (see
+# MARKET_EXPIRY) can only be found by the old username, if it is still cached
+def _rename(chat_id: int, old: Optional[str], new: str) -> None:
+    with transaction() as conn:
+        conn.execute("UPDATE Market SET Seller=? WHERE ChatID=? AND Seller<>?", (new, str(chat_id), new))
+        conn.execute("UPDATE Requests SET Seller=? WHERE ChatID=? AND Seller<>?", (new, str(chat_id), new))
+        if old is not None:
+            conn.execute("UPDATE Market SET Seller=? WHERE Seller=? AND ChatID IS NULL", (new, old))
+    logger.info("Seller of chat %s renamed to %s", chat_id, new)
+
+
+# the username is compared with the stored one when it changes, and whenever the chat isn't
+# cached (e.g. after a restart), as the user may have changed it in the meantime
+def _remember(chat_id: int, username: Optional[str]) -> None:
+    cached = _usernames.get(chat_id)
+    _usernames.put(chat_id, (username,))
+    if username is None or (cached is not None and cached[0] == username):
+        return
+    old = cached[0] if cached is not None else None
+    if old is not None:
+        _rename(chat_id, old, username)
+        return
+    with get_connection() as conn:
+        stale = conn is not None and conn.execute(STALE_SELLER, (str(chat_id), username)).fetchone()[0]
+    if stale:
+        _rename(chat_id, None, username)
+
+
+# runs before every handler (group -1), so the cache always has the current username
+# of whoever is using the bot, and the change of a username is noticed at the first update
+def remember_user(update: Update, _: CallbackContext) -> None:
+    user = update.effective_user
+    chat = update.effective_chat
+    # in groups the chat id is not the user's one
+    if user is not None and chat is not None and chat.id == user.id:
+        _remember(chat.id, _format(user))
+
+
+# "@username" of the user in the private chat chat_id, None if they have no username.
+# Telegram is asked only if the user hasn't been seen recently
+def get_username(context: CallbackContext, chat_id: int) -> Optional[str]:
+    cached = _usernames.get(chat_id)
+    if cached is not None:
+        return cached[0]
+    username = context.bot.get_chat(chat_id).username
+    username = "@" + username if username else None
+    _remember(chat_id, username)
+    return username
@@ -0,0 +1,121 @@
+import re
+from typing import List
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import CallbackContext
+from module.create_connection import connect_and_execute, transaction
+from module.isbn import canonical_isbn
+from module.send_results import get_item_info
+from module.shared import MESSAGE_MAX_LENGTH, WATCH_USAGE, WATCH_ADDED, WATCH_EXISTS, WATCH_LIMIT_REACHED, WATCH_LIST, WATCH_MATCH, WATCH_LIMIT, WATCH_MIN_WORD, WATCH_MAX_WORD, UNWATCH, SELECT
+from module.message_queue import queue_message
+from module.text_fold import fold
+
+WATCHES_BY_ISBN = "SELECT ChatID FROM Watches WHERE ISBN=?"
+
+# the keyword watches whose every word starts one of the words of the book (given as their prefixes)
+WATCHES_BY_WORDS = "SELECT w.ChatID FROM WatchWords ww JOIN Watches w ON w.Id = ww.WatchId " \
+                   "WHERE ww.Word IN ({}) GROUP BY w.Id HAVING COUNT(*) = w.Words"
+
+
+# the distinct keywords of a watch, lowercase and without accents
+def _keywords(txt: str) -> List[str]:
+    words = []
+    for word in re.findall(r"\w+", fold(txt)):
+        word = word[:WATCH_MAX_WORD]
+        if len(word) >= WATCH_MIN_WORD and word not in words:
+            words.append(word)
+    return words
+
+
+# the keywords that match a word of the text
+def _prefixes(txt: str) -> List[str]:
+    return sorted({word[:n] for word in re.findall(r"\w+", fold(txt)) for n in range(WATCH_MIN_WORD, min(len(word), WATCH_MAX_WORD) + 1)})
+
+
+# subscribes the chat to the books with the given ISBN or keywords, returns the reply for the user
+def add_watch(chat_id: int, txt: str) -> str:
+    isbn = canonical_isbn(txt)
+    words = [] if isbn else _keywords(txt)
+    keywords = " ".join(words) or None
+    if not isbn and not keywords:
+        return WATCH_USAGE
+
+    with transaction() as conn:
+        watches = conn.execute("SELECT ISBN, Keywords FROM Watches WHERE ChatID=?", (str(chat_id),)).fetchall()
+        if (isbn, keywords) in watches:
+            return WATCH_EXISTS
+        if len(watches) >= WATCH_LIMIT:
+            return WATCH_LIMIT_REACHED
+        cur = conn.execute("INSERT INTO Watches(ChatID, ISBN, Keywords, Words) VALUES(?,?,?,?)", (str(chat_id), isbn, keywords, len(words)))
+        conn.executemany("INSERT INTO WatchWords(Word, WatchId) VALUES(?,?)", ((word, cur.lastrowid) for word in words))
+    return WATCH_ADDED
+
+
+# a chat can only remove its own watches
+def remove_watch(chat_id: int, watch_id: int) -> None:
+    with transaction() as conn:
+        row = conn.execute("SELECT Keywords FROM Watches WHERE Id=? AND ChatID=?", (watch_id, str(chat_id))).fetchone()
+        if row is None:
+            return
+        conn.executemany("DELETE FROM WatchWords WHERE Word=? AND WatchId=?", ((word, watch_id) for word in (row[0] or "").split()))
+        conn.execute("DELETE FROM Watches WHERE Id=?", (watch_id,))
+
+
+# the watches of the chat, with a button to remove each of them
+def show_watches(context: CallbackContext, chat_id: int) -> None:
+    query = "SELECT Id, ISBN, Keywords FROM Watches WHERE ChatID=? ORDER BY Id"
+    rows = connect_and_execute(context, chat_id, query, (str(chat_id),), SELECT, "watches")
+    if not rows:
+        queue_message(context, chat_id, WATCH_USAGE)
+        return
+
+    text = WATCH_LIST + "".join(f"{i}. {isbn or keywords}\n" for i, (_, isbn, keywords) in enumerate(rows, start = 1))
+    keyboard = [InlineKeyboardButton(f"❌ {i}", callback_data = f"{UNWATCH};{row[0]}") for i, row in enumerate(rows, start = 1)]
+    # a row of buttons fits at most 8 of them
+    reply_markup = InlineKeyboardMarkup([keyboard[i:i + 8] for i in range(0, len(keyboard), 8)])
+    queue_message(context, chat_id, text, reply_markup)
+
+
+# tells the watchers about the books just put on sale, given as (seller's chat id, ISBN, title,
+# authors, seller, price). Each new book only looks up the watches of its ISBN and the ones
+# sharing one of its words, and each chat gets a single message however many books and watches matched
+def notify_watchers(context: CallbackContext, listings: List[tuple]) -> None:
+    matches = {}
+    for seller_chat_id, isbn, title, authors, seller, price in listings:
+        rows = connect_and_execute(context, seller_chat_id, WATCHES_BY_ISBN, (isbn,), SELECT, "watches_by_isbn") or []
+        prefixes = _prefixes(f"{title} {authors} {isbn}")
+        if prefixes:
+            query = WATCHES_BY_WORDS.format(",".join("?" * len(prefixes)))
+            rows += connect_and_execute(context, seller_chat_id, query, tuple(prefixes), SELECT, "watches_by_words") or []
+
+        # the seller doesn't need to know about their own book
+        for chat_id in {row[0] for row in rows} - {str(seller_chat_id)}:
+            matches.setdefault(chat_id, []).append(get_item_info(isbn, title, authors, seller, price))
+
+    for chat_id, items in matches.items():
+        for text in _messages(items):
+            queue_message(context, chat_id, text)
+
+
+# the matches of a chat as few messages as Telegram allows, each within MESSAGE_MAX_LENGTH
+def _messages(items: List[str]) -> List[str]:
+    messages = []
+    text = WATCH_MATCH
+    for item in items:
+        item = item[:MESSAGE_MAX_LENGTH - len(WATCH_MATCH)]
+        if text != WATCH_MATCH and len(text) + 1 + len(item) > MESSAGE_MAX_LENGTH:
+            messages.append(text)
+            text = WATCH_MATCH
+        text += ("\n" if text != WATCH_MATCH else "") + item
+    messages.append(text)
+    return messages
+
+
+def watch(update: Update, context: CallbackContext) -> None:
+    chat_id = update.effective_chat.id
+    message = update.message.text
+    if message == "/avvisami":
+        show_watches(context, chat_id)
+        return
+
+    _, message = message.split("/avvisami ", 1)
+    queue_message(context, chat_id, add_watch(chat_id, message))
@@ -6,10 +6,32 @@ class SearchBar extends HTMLElement {
 
     setup() {
         this.input = document.getElementById('search-input');
+        this.suggestions = document.getElementById('search-suggestions');
         this.input.addEventListener('input', this.oninput.bind(this));
     }
 
+    suggest(current) {
+        // the suggestions are cheap, so they
+        // follow the user's typing more closely
+        setTimeout(() => {
+            if (current != this.input.value) return;
+            if (current.trim().length < 2) {
+                this.suggestions.replaceChildren();
+                return;
+            }
+            app.api.suggest(current, (response) => {
+                if (current != this.input.value || !response.success) return;
+                this.suggestions.replaceChildren(...response.suggestions.map((suggestion) => {
+                    let option = document.createElement('option');
+                    option.value = suggestion.text;
+                    return option;
+                }));
+            });
+        }, 150);
+    }
+
     oninput(event) {
+        this.suggest(this.input.value);
         // request the API
         // remember the current value
         let current = this.input.value;
@@ -17,6 +39,11 @@ class SearchBar extends HTMLElement {
         // the user is still typing
         setTimeout(() => {
             if (current != this.input.value) return;
+            // the server ignores queries shorter than 3 characters
+            if (current.trim().length < 3) {
+                app.results.update([]);
+                return;
+            }
             app.api.search(this.input.value, (response) => {
                 // in case the user has typed some other
                 // characters, don't display the
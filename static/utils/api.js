@@ -1,8 +1,20 @@
 // Interact with the backend.
 class API {
-    search(query, callback) {
-        // search a book and return JSON response
-        fetch(`search?q=${query}`)
+    search(query, callback, cursor = null) {
+        // search a book and return JSON response;
+        // the browser revalidates the cached response
+        // with its ETag, so unchanged results cost a 304
+        let url = `search?q=${encodeURIComponent(query)}&limit=20`;
+        if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+        fetch(url, {cache: 'no-cache'})
+         .then((response) => response.json())
+         .then((data) => callback(data));
+    }
+
+    suggest(query, callback) {
+        // completions of the titles, authors
+        // and ISBNs on sale, while typing
+        fetch(`suggest?q=${encodeURIComponent(query)}`)
          .then((response) => response.json())
          .then((data) => callback(data));
     }
@@ -0,0 +1,206 @@
+# Bulk import of books and export of the database, e.g. to fill the Books of a new deployment from a booklist.
+#
+# python -m tools.bulk import FILE [--format csv|jsonl] [--batch N] [--workers N] [--restart] [--db DB]
+#   FILE lists one book per line: a CSV whose first columns are ISBN[, title, authors] (with or
+#   without a header), or JSONL with objects like {"isbn": ..., "title": ..., "authors": ...} or
+#   plain ISBN strings. The books without title and authors are looked up in the university catalog.
+#   The books are inserted a batch at a time and FILE.progress remembers how many lines were
+#   done, so an interrupted import starts again from there.
+#
+# python -m tools.bulk export books|market [--output FILE] [--db DB]
+#   writes the table as JSONL, one row per line
+import argparse
+import csv
+import dataclasses
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, TextIO
+import requests
+from module.book_in_unict import book_in_unict
+from module.config import Config, load_config, set_config, get_config
+from module.create_connection import get_connection, transaction, close_connections
+from module.isbn import canonical_isbn
+from module.migrations import migrate
+from module.shared import CATALOG_WORKERS
+
+BATCH_SIZE = 500
+
+EXPORTS = {
+    "books": "SELECT ISBN, Title, Authors FROM Books ORDER BY rowid",
+    "market": "SELECT rowid AS Id, ISBN, Title, Authors, Seller, Price FROM Market ORDER BY rowid",
+}
+
+
+# (isbn, title, authors) of each line; title and authors are None if they must be looked up
+def _read_csv(source: TextIO) -> Iterator[tuple]:
+    rows = csv.reader(source)
+    first = next(rows, None)
+    if first is None:
+        return
+    columns = [cell.strip().lower() for cell in first]
+    if "isbn" in columns:
+        index = {name: columns.index(name) if name in columns else None for name in ("isbn", "title", "authors")}
+    else:
+        index = {"isbn": 0, "title": 1, "authors": 2}
+        rows = itertools.chain([first], rows)
+    for row in rows:
+        def cell(name, row = row):
+            i = index[name]
+            return row[i].strip() if i is not None and i < len(row) and row[i].strip() else None
+        yield (cell("isbn") or "", cell("title"), cell("authors"))
+
+
+def _read_jsonl(source: TextIO) -> Iterator[tuple]:
+    for line in source:
+        if not line.strip():
+            yield ("", None, None)
+            continue
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            yield (str(record), None, None)
+            continue
+        record = {key.lower(): value for key, value in record.items()}
+        yield (str(record.get("isbn") or ""), record.get("title") or None, record.get("authors") or None)
+
+
+# the book to insert for a line, or the reason it is skipped
+def _resolve(line: tuple, known: set) -> tuple:
+    isbn, title, authors = line
+    isbn = canonical_isbn(isbn)
+    if isbn is None:
+        return "invalid", None
+    if isbn in known:
+        return "present", None
+    if title and authors:
+        return "inserted", (isbn, title, authors)
+    try:
+        found, book = book_in_unict(isbn)
+    except ValueError:
+        # the catalog answered with a page that couldn't be parsed
+        return "error", None
+    return ("inserted", book) if found else ("not_found", None)
+
+
+def _known(conn, batch: list) -> set:
+    isbns = [canonical_isbn(isbn) or "" for isbn, _, _ in batch]
+    marks = ",".join("?" * len(isbns))
+    return {row[0] for row in conn.execute(f"SELECT ISBN FROM Books WHERE ISBN IN ({marks})", isbns)}
+
+
+def _load_progress(path: str) -> int:
+    try:
+        with open(path, "r", encoding = "utf-8") as progress:
+            return int(progress.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _save_progress(path: str, done: int) -> None:
+    with open(path + ".tmp", "w", encoding = "utf-8") as progress:
+        progress.write(str(done))
+    os.replace(path + ".tmp", path)
+
+
+# pylint: disable=too-many-locals
+def import_books(path: str, file_format: str, batch_size: int, workers: int, restart: bool) -> dict:
+    progress_path = path + ".progress"
+    done = 0 if restart else _load_progress(progress_path)
+    totals = {"inserted": 0, "present": 0, "not_found": 0, "invalid": 0, "error": 0}
+    reader = _read_jsonl if file_format == "jsonl" else _read_csv
+
+    with open(path, "r", encoding = "utf-8", newline = "") as source, ThreadPoolExecutor(max_workers = workers) as executor:
+        lines = itertools.islice(reader(source), done, None)
+        if done:
+            print(f"resuming after {done} lines", file = sys.stderr)
+        while True:
+            batch = list(itertools.islice(lines, batch_size))
+            if not batch:
+                break
+            with get_connection() as conn:
+                known = _known(conn, batch)
+            # the catalog is asked for at most `workers` books at a time
+            results = list(executor.map(lambda line: _resolve(line, known), batch))
+            books = [book for outcome, book in results if outcome == "inserted"]
+            with transaction() as conn:
+                before = conn.total_changes
+                conn.executemany("INSERT OR IGNORE INTO Books(ISBN, Title, Authors) VALUES(?,?,?)", books)
+                inserted = conn.total_changes - before
+            for outcome, _ in results:
+                totals[outcome] += 1
+            # books that were in the same batch twice, or were listed with another form of the same ISBN
+            totals["inserted"] -= len(books) - inserted
+            totals["present"] += len(books) - inserted
+            done += len(batch)
+            _save_progress(progress_path, done)
+            print(f"{done} lines: " + ", ".join(f"{key} {value}" for key, value in totals.items()), file = sys.stderr)
+
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    return totals
+
+
+def export_table(table: str, output: Optional[str]) -> int:
+    rows = 0
+    target = open(output, "w", encoding = "utf-8") if output else sys.stdout # pylint: disable=consider-using-with
+    try:
+        with get_connection() as conn:
+            cur = conn.execute(EXPORTS[table])
+            columns = [column[0].lower() for column in cur.description]
+            # the cursor reads the rows as they are written, not all at once
+            for row in cur:
+                target.write(json.dumps(dict(zip(columns, row)), ensure_ascii = False) + "\n")
+                rows += 1
+    finally:
+        if output:
+            target.close()
+    return rows
+
+
+def _setup(db_file: Optional[str]) -> None:
+    try:
+        load_config()
+    except FileNotFoundError:
+        set_config(Config())
+    if db_file:
+        set_config(dataclasses.replace(get_config(), db_path = db_file))
+    with get_connection() as conn:
+        migrate(conn)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Bulk import and export of the bookmarket database")
+    parser.add_argument("--db", help = "database file, instead of the one in config/settings.yaml")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    importer = commands.add_parser("import", help = "insert into Books the books listed in a CSV or JSONL file")
+    importer.add_argument("file")
+    importer.add_argument("--format", choices = ("csv", "jsonl"), help = "by default, the file's extension")
+    importer.add_argument("--batch", type = int, default = BATCH_SIZE, help = "books inserted in each transaction")
+    importer.add_argument("--workers", type = int, default = CATALOG_WORKERS, help = "concurrent catalog lookups")
+    importer.add_argument("--restart", action = "store_true", help = "ignore the progress of a previous import")
+    exporter = commands.add_parser("export", help = "write Books or Market as JSONL")
+    exporter.add_argument("table", choices = sorted(EXPORTS))
+    exporter.add_argument("--output", help = "by default, the standard output")
+    args = parser.parse_args()
+
+    _setup(args.db)
+    try:
+        if args.command == "import":
+            file_format = args.format or ("jsonl" if args.file.endswith((".jsonl", ".json")) else "csv")
+            try:
+                totals = import_books(args.file, file_format, args.batch, args.workers, args.restart)
+            except requests.RequestException as e:
+                # the progress is saved: running the same command again resumes the import
+                sys.exit(f"The catalog could not be reached ({e}), run the import again to resume it")
+            print(json.dumps(totals))
+        else:
+            rows = export_table(args.table, args.output)
+            print(f"{rows} rows exported", file = sys.stderr)
+    finally:
+        close_connections()
+
+
+if __name__ == '__main__':
+    main()
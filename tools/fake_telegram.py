@@ -0,0 +1,138 @@
+# Fake Telegram, to try the bot end to end in webhook mode without a real bot.
+# It answers the Bot API calls the bot makes and posts to the bot's webhook the
+# updates of a fake user, one for each line read from the standard input:
+#   /cerca analisi          a message
+#   !page;cerca;1;0;        a press of the inline button with that callback data
+#
+# config/settings.yaml:
+#   token: "123456:fake"
+#   webhook_url: "http://localhost:5000"
+#   api_url: "http://localhost:8081/bot"
+#
+# python -m tools.fake_telegram --port 8081 (start it before main.py, that registers the webhook)
+import argparse
+import itertools
+import json
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+USER = {"id": 1000, "is_bot": False, "first_name": "Test", "username": "tester"}
+CHAT = {"id": 1000, "type": "private", "username": "tester", "first_name": "Test"}
+BOT = {"id": 1, "is_bot": True, "first_name": "BookMarket", "username": "fake_bookmarket_bot"}
+
+_ids = itertools.count(1)
+_state = {"webhook": None, "last_reply": 0.0}
+_state_lock = threading.Lock()
+
+
+def _message(chat_id, text: str) -> dict:
+    chat = dict(CHAT, id = int(chat_id)) if int(chat_id) > 0 else {"id": int(chat_id), "type": "supergroup", "title": "Admin"}
+    return {"message_id": next(_ids), "date": int(time.time()), "chat": chat, "from": BOT, "text": text}
+
+
+def _show(chat_id, text: str, reply_markup) -> None:
+    print(f"\n<<< [{chat_id}] {text}")
+    if reply_markup:
+        markup = json.loads(reply_markup) if isinstance(reply_markup, str) else reply_markup
+        for row in markup.get("inline_keyboard", []):
+            print("    " + "  ".join(f"[{button['text']} -> !{button.get('callback_data')}]" for button in row))
+    with _state_lock:
+        _state["last_reply"] = time.monotonic()
+
+
+# result of each Bot API method
+def _call(method: str, params: dict):
+    if method == "getMe":
+        return BOT
+    if method == "setWebhook":
+        _state["webhook"] = params["url"]
+        print(f"webhook set to {params['url']}")
+        return True
+    if method in ("sendMessage", "editMessageText"):
+        _show(params.get("chat_id", CHAT["id"]), params.get("text"), params.get("reply_markup"))
+        return _message(params.get("chat_id", CHAT["id"]), params.get("text"))
+    if method == "getChat":
+        return dict(CHAT, id = int(params["chat_id"]))
+    return True
+
+
+class BotApi(BaseHTTPRequestHandler):
+    def do_POST(self): # pylint: disable=invalid-name
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            params = json.loads(body or b"{}")
+        else:
+            params = dict(parse_qsl(body.decode()))
+        method = self.path.rsplit("/", 1)[-1]
+        data = json.dumps({"ok": True, "result": _call(method, params)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST
+
+    def log_message(self, *args): # pylint: disable=arguments-differ
+        pass
+
+
+def _update(line: str) -> dict:
+    update_id = next(_ids)
+    if line.startswith("!"):
+        message = dict(_message(CHAT["id"], "..."), **{"from": BOT})
+        return {"update_id": update_id, "callback_query": {"id": str(update_id), "from": USER, "chat_instance": "1",
+                                                           "message": message, "data": line[1:]}}
+    text = line.strip()
+    entities = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith("/") else []
+    return {"update_id": update_id, "message": {"message_id": next(_ids), "date": int(time.time()), "chat": CHAT,
+                                                "from": USER, "text": text, "entities": entities}}
+
+
+def _post(url: str, update: dict) -> int:
+    req = urllib.request.Request(url, json.dumps(update).encode(), {"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout = 10) as response:
+        return response.status
+
+
+# waits until the bot has been quiet for a while, so the replies are shown before the next line
+def _wait_replies(quiet: float, timeout: float) -> None:
+    start = time.monotonic()
+    time.sleep(quiet)
+    while time.monotonic() - start < timeout:
+        with _state_lock:
+            idle = time.monotonic() - max(_state["last_reply"], start)
+        if idle >= quiet:
+            return
+        time.sleep(0.05)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type = int, default = 8081, help = "port of the fake Bot API")
+    parser.add_argument("--quiet", type = float, default = 1.0, help = "seconds without replies before the next line")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), BotApi)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    print(f"fake Bot API on http://127.0.0.1:{args.port}/bot, waiting for the bot's webhook")
+    while _state["webhook"] is None:
+        time.sleep(0.1)
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        print(f"\n>>> {line.strip()}")
+        status = _post(_state["webhook"], _update(line.strip()))
+        if status != 200:
+            print(f"webhook answered {status}")
+        _wait_replies(args.quiet, timeout = 30)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()